@@ -0,0 +1,211 @@
+from agents import Runner, trace, set_tracing_export_api_key
+from openai.types.responses import ResponseTextDeltaEvent
+import  os
+from dotenv import load_dotenv
+load_dotenv()
+from tools import get_file_content, search_indicators_by_report, search_by_victim, get_reportsID_by_technique, get_reports_by_reportID
+from vectorstore import find_ingested_report, warm_up_vector_store
+from utils import S3StreamingUpload
+from database import close_pool, pool_stats, close_async_pool, async_pool_stats
+from ingestion_queue import UPLOAD_DIR, QueueFull, enqueue, get_job, queue_stats, start_workers, stop_workers
+from document_parser import shutdown_parser
+from embeddings import embedding_stats
+from react_loop import tool_call_stats
+from history import history_stats
+from result_cache import result_cache_stats
+
+from chatkit.server import StreamingResult
+from fastapi import FastAPI, Request, UploadFile, File
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from chatkit_server import MyAgentServer
+import asyncio
+import hashlib
+import shutil
+import uuid
+
+app = FastAPI(title="ChatKit Backend")
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["http://localhost:5173"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+chatkit_server = MyAgentServer()
+
+
+@app.on_event("startup")
+async def start_background_workers():
+    start_workers()
+    # In the background: startup is not held up if Ollama is slow or down
+    app.state.vector_store_warm_up = asyncio.create_task(asyncio.to_thread(warm_up_vector_store))
+
+
+@app.on_event("shutdown")
+async def release_resources():
+    """Make sure debounced chat history writes reach disk and close DB pools."""
+    await stop_workers()
+    shutdown_parser()
+    chatkit_server.store.flush()
+    close_pool()
+    await close_async_pool()
+
+
+@app.get("/api/metrics")
+async def metrics():
+    """Runtime counters for the backend's shared resources."""
+    return {
+        "db_pool": pool_stats(),
+        "db_async_pool": async_pool_stats(),
+        "ingestion": await queue_stats(),
+        "embedding": embedding_stats(),
+        "tool_calls": tool_call_stats(),
+        "history": history_stats(),
+        "tool_results": result_cache_stats(),
+    }
+
+
+@app.post("/chatkit")
+async def chatkit_endpoint(request: Request) -> Response:
+    """Proxy the ChatKit web component payload to the server implementation."""
+    payload = await request.body()
+    result = await chatkit_server.process(payload, {"request": request})
+
+    if isinstance(result, StreamingResult):
+        return StreamingResponse(result, media_type="text/event-stream")
+    if hasattr(result, "json"):
+        return Response(content=result.json, media_type="application/json")
+    return JSONResponse(result)
+
+
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+# Seconds clients are asked to wait when the ingestion queue is full or unavailable
+UPLOAD_RETRY_AFTER = "30"
+# Largest accepted upload in bytes; bigger bodies are rejected with 413
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", str(200 * 1024 * 1024)))
+
+
+def _upload_name(filename: str) -> str | None:
+    """The client's file name reduced to a bare file name, or None if nothing usable is left."""
+    name = os.path.basename(filename.replace("\\", "/")).strip()
+    return None if name in ("", ".", "..") else name
+
+
+async def _discard_upload(upload_dir, s3_upload):
+    shutil.rmtree(upload_dir, ignore_errors=True)
+    if s3_upload is not None:
+        await s3_upload.discard()
+
+
+@app.put("/api/upload")
+async def handle_file_upload(request: Request, filename: str):
+    """
+    Streams the upload to disk and to S3 and queues it for ingestion. Returns
+    202 with a job id right away; poll /api/upload/jobs/{job_id} for progress.
+    The body is never held in memory as a whole.
+    """
+    declared_size = request.headers.get("content-length")
+    if declared_size and declared_size.isdigit() and int(declared_size) > UPLOAD_MAX_BYTES:
+        return JSONResponse({"success": False, "message": f"File exceeds {UPLOAD_MAX_BYTES} bytes"}, status_code=413)
+
+    # Only the base name is used (as the report filename and on disk); paths in it are dropped
+    filename = _upload_name(filename)
+    if filename is None:
+        return JSONResponse({"success": False, "message": "Invalid file name"}, status_code=400)
+
+    # Re-uploads of a known report skip S3, parsing, extraction and embedding
+    existing = await find_ingested_report(filename, None)
+    if existing:
+        print(f"File {filename} already ingested as Report ID {existing[0]}")
+        return {"success" : True, "message" : "File already ingested", "report_id": existing[0]}
+
+    # One directory per upload, so a pending job's file is never overwritten
+    # and the basename (used as the report filename) is kept
+    upload_dir = os.path.join(UPLOAD_DIR, uuid.uuid4().hex[:16])
+    file_path = os.path.join(upload_dir, filename)
+    os.makedirs(upload_dir, exist_ok=True)
+
+    s3_upload = None
+    bucket_name = os.environ.get("S3_BUCKET_NAME")
+    if bucket_name:
+        try:
+            s3_upload = S3StreamingUpload(bucket_name, file_path)
+            await s3_upload.start()
+        except Exception as e:
+            print(f"S3 streaming upload unavailable, the ingestion job will upload instead: {e}")
+            s3_upload = None
+
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        with open(file_path, "wb") as buffer:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > UPLOAD_MAX_BYTES:
+                    await _discard_upload(upload_dir, s3_upload)
+                    return JSONResponse({"success": False, "message": f"File exceeds {UPLOAD_MAX_BYTES} bytes"},
+                                        status_code=413)
+                hasher.update(chunk)
+                buffer.write(chunk)
+                if s3_upload is not None:
+                    try:
+                        await s3_upload.write(chunk)
+                    except Exception as e:
+                        print(f"S3 streaming upload failed, the ingestion job will upload instead: {e}")
+                        await s3_upload.discard()
+                        s3_upload = None
+    except Exception:
+        # Client went away or the disk filled up
+        await _discard_upload(upload_dir, s3_upload)
+        raise
+
+    content_hash = hasher.hexdigest()
+    existing = await find_ingested_report(filename, content_hash)
+    if existing:
+        print(f"File {filename} already ingested as Report ID {existing[0]} ({existing[1]})")
+        await _discard_upload(upload_dir, s3_upload)
+        return {"success" : True, "message" : "File already ingested", "report_id": existing[0]}
+
+    s3_url = None
+    if s3_upload is not None:
+        try:
+            s3_url = await s3_upload.complete()
+        except Exception as e:
+            print(f"S3 streaming upload failed, the ingestion job will upload instead: {e}")
+            await s3_upload.discard()
+            s3_upload = None
+
+    try:
+        job_id, created = await enqueue(filename, file_path, content_hash, s3_url=s3_url)
+    except QueueFull as e:
+        await _discard_upload(upload_dir, s3_upload)
+        return JSONResponse({"success": False, "message": str(e)}, status_code=429,
+                            headers={"Retry-After": UPLOAD_RETRY_AFTER})
+    except Exception as e:
+        print(f"Could not enqueue {filename}: {e}")
+        await _discard_upload(upload_dir, s3_upload)
+        return JSONResponse({"success": False, "message": "Ingestion queue unavailable"}, status_code=503,
+                            headers={"Retry-After": UPLOAD_RETRY_AFTER})
+    if not created:
+        await _discard_upload(upload_dir, s3_upload)
+
+    message = "File queued for ingestion" if created else "File is already being ingested"
+    print(f"{message}: {filename} ({size} bytes, job {job_id})")
+    return JSONResponse(
+        {"success": True, "message": message, "job_id": job_id, "status_url": f"/api/upload/jobs/{job_id}"},
+        status_code=202,
+    )
+
+
+@app.get("/api/upload/jobs/{job_id}")
+async def upload_job_status(job_id: int):
+    """Status, current stage, attempts and outcome of an ingestion job."""
+    job = await get_job(job_id)
+    if job is None:
+        return JSONResponse({"success": False, "message": "Job not found"}, status_code=404)
+    return job
+
@@ -1,4 +1,4 @@
-from chatkit.store import AttachmentStore
+from chatkit.store import AttachmentStore, Store
 from chatkit.types import AttachmentCreateParams, Attachment, FileAttachment, AttachmentUploadDescriptor
 from uuid import uuid4
 from typing import Any
@@ -8,7 +8,7 @@ from memory_store import MemoryStore
 BASE_URL = "http://localhost:8000"
 
 class BlobAttachmentStore(AttachmentStore[dict]):
-    def __init__(self, store: MemoryStore = None):
+    def __init__(self, store: Store[dict] = None):
         self.store = store or MemoryStore()
 
     def generate_attachment_id(self, mime_type: str, context: dict) -> str:
@@ -0,0 +1,94 @@
+"""
+Rows/sec of the ingestion write path: one INSERT per IoC/TTP versus the
+set-based database.insert_report_iocs / insert_report_techniques.
+
+Runs against the scratch database used by bench_indexes (BENCH_DB), which is
+reset and migrated first. Each variant inserts one report with --iocs IoCs
+(with --dup-ratio of them repeated, as in hash dumps) and --ttps TTPs inside
+a single transaction.
+
+    uv run python -m benchmarks.bench_bulk_insert --iocs 5000
+"""
+
+import argparse
+import random
+import time
+
+import psycopg2
+
+from benchmarks.bench_indexes import BENCH_DB, ensure_database
+from database import DB_CONFIG, TABLE_SCHEMA, apply_migrations, insert_report_iocs, insert_report_techniques
+
+
+def make_payload(n_iocs: int, n_ttps: int, dup_ratio: float, seed: int):
+    rng = random.Random(seed)
+    unique = max(1, int(n_iocs * (1 - dup_ratio)))
+    values = [f"{rng.getrandbits(128):032x}" for _ in range(unique)]
+    iocs = [("Hash", rng.choice(values)) for _ in range(n_iocs)]
+    ttps = [(f"T{1000 + rng.randrange(600)}", "Technique") for _ in range(n_ttps)]
+    return iocs, ttps
+
+
+def new_report(cur, name: str) -> int:
+    cur.execute("INSERT INTO reports (filename) VALUES (%s) RETURNING report_id", (name,))
+    return cur.fetchone()[0]
+
+
+def per_row(cur, report_id, iocs, ttps):
+    """The previous write path: one round-trip per row."""
+    for ioc_type, value in iocs:
+        cur.execute("""
+            WITH d AS (
+                INSERT INTO ioc (type, value) VALUES (%s, %s)
+                ON CONFLICT (type, value) DO UPDATE SET type = EXCLUDED.type
+                RETURNING ioc_id
+            )
+            INSERT INTO report_iocs (report_id, ioc_id) SELECT %s, ioc_id FROM d
+            ON CONFLICT DO NOTHING
+        """, (ioc_type, value, report_id))
+    for technique_id, name in ttps:
+        cur.execute(
+            "INSERT INTO technique (technique_id, name) VALUES (%s, %s) ON CONFLICT (technique_id) DO NOTHING",
+            (technique_id, name),
+        )
+        cur.execute(
+            "INSERT INTO report_techniques (report_id, technique_id) VALUES (%s, %s) ON CONFLICT DO NOTHING",
+            (report_id, technique_id),
+        )
+    return len(set(iocs)) + len({technique_id for technique_id, _ in ttps})
+
+
+def bulk(cur, report_id, iocs, ttps):
+    return insert_report_iocs(cur, report_id, iocs) + insert_report_techniques(cur, report_id, ttps)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--iocs", type=int, default=5000)
+    parser.add_argument("--ttps", type=int, default=50)
+    parser.add_argument("--dup-ratio", type=float, default=0.2)
+    args = parser.parse_args()
+
+    ensure_database()
+    conn = psycopg2.connect(dbname=BENCH_DB, **DB_CONFIG)
+    cur = conn.cursor()
+    cur.execute("DROP SCHEMA public CASCADE; CREATE SCHEMA public")
+    cur.execute(TABLE_SCHEMA)
+    conn.commit()
+    apply_migrations(conn)
+
+    print(f"{'variant':10} {'input rows':>11} {'distinct':>12} {'seconds':>9} {'input rows/s':>13}")
+    # Separate seeds so the second variant does not hit ioc rows created by the first
+    for seed, (label, write) in enumerate([("per-row", per_row), ("bulk", bulk)]):
+        iocs, ttps = make_payload(args.iocs, args.ttps, args.dup_ratio, seed)
+        started = time.perf_counter()
+        stored = write(cur, new_report(cur, label), iocs, ttps)
+        conn.commit()
+        elapsed = time.perf_counter() - started
+        total = len(iocs) + len(ttps)
+        print(f"{label:10} {total:11} {stored:12} {elapsed:9.3f} {total / elapsed:13.0f}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
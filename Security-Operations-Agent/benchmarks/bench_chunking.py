@@ -0,0 +1,74 @@
+"""
+Embedding throughput and index size with one Chroma document per
+unstructured element (the previous ingest_txt behaviour) versus the chunks
+from chunking.chunk_elements.
+
+Each variant is embedded with the same Ollama model as the server into a
+fresh Chroma directory under a temporary folder, so the index size is what
+the variant adds on disk. Needs Ollama running on localhost:11434.
+
+    uv run python -m benchmarks.bench_chunking reports/*.pdf
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import uuid
+
+import chromadb
+from chromadb.utils.embedding_functions.ollama_embedding_function import OllamaEmbeddingFunction
+
+import chunking
+import document_parser
+
+
+def dir_size(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, files in os.walk(path)
+        for name in files
+    )
+
+
+def embed(label: str, documents: list[str], emb_fn, batch: int):
+    with tempfile.TemporaryDirectory() as path:
+        collection = chromadb.PersistentClient(path=path).create_collection(
+            name="bench", embedding_function=emb_fn
+        )
+        started = time.perf_counter()
+        for first in range(0, len(documents), batch):
+            part = documents[first:first + batch]
+            collection.add(documents=part, ids=[str(uuid.uuid4()) for _ in part])
+        elapsed = time.perf_counter() - started
+        size = dir_size(path)
+    words = sum(len(d.split()) for d in documents)
+    print(f"{label:10} {len(documents):7} docs  {words / max(len(documents), 1):6.0f} words/doc  "
+          f"{elapsed:8.2f}s  {len(documents) / elapsed:7.1f} docs/s  {words / elapsed:8.0f} words/s  "
+          f"index {size / 1024 / 1024:7.1f} MiB")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("files", nargs="+", help=".pdf or .txt reports")
+    parser.add_argument("--model", default="mxbai-embed-large:latest")
+    parser.add_argument("--batch", type=int, default=100, help="documents per collection.add call")
+    args = parser.parse_args()
+
+    elements, chunks = [], []
+    for path in args.files:
+        document = await document_parser.partition_document(path)
+        elements += [el["text"] for el in document]
+        chunks += [chunk["text"] for chunk in chunking.chunk_elements(document)]
+    document_parser.shutdown_parser()
+
+    print(f"{len(args.files)} reports, CHUNK_TOKENS={chunking.CHUNK_TOKENS}, "
+          f"CHUNK_OVERLAP_TOKENS={chunking.CHUNK_OVERLAP_TOKENS}, CHUNK_MIN_TOKENS={chunking.CHUNK_MIN_TOKENS}")
+    emb_fn = OllamaEmbeddingFunction(url="http://localhost:11434", model_name=args.model)
+    embed("elements", elements, emb_fn, args.batch)
+    embed("chunks", chunks, emb_fn, args.batch)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,154 @@
+"""
+Latency of the tool lookups in tools.py on the baseline schema and, as
+tools.py runs them, after the schema migrations (indexes, normalized IoC/TTP
+tables).
+
+Seeds a scratch database (BENCH_DB, default 'siem_bench') with synthetic
+reports, IoCs and TTPs, times every query on the bare tables, applies
+database.MIGRATIONS and times them again. The scratch schema is dropped and
+recreated on every run; TARGET_DB is never touched.
+
+    uv run python -m benchmarks.bench_indexes --reports 100000
+"""
+
+import argparse
+import os
+import statistics
+import time
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+from database import DB_CONFIG, TABLE_SCHEMA, apply_migrations
+
+BENCH_DB = os.environ.get("BENCH_DB", "siem_bench")
+
+SEED_SQL = """
+INSERT INTO reports (filename, summary, severity, victim_sector, raw_content)
+SELECT 'report_' || g || '.txt',
+       'Synthetic report ' || g,
+       (ARRAY['High', 'Medium', 'Low'])[1 + g %% 3],
+       (ARRAY['Finance', 'Healthcare', 'Energy', 'Government', 'Retail',
+              'Telecom', 'Manufacturing', 'Education'])[1 + g %% 8] || ' sector ' || (g %% 97),
+       repeat('lorem ipsum ', 20)
+FROM generate_series(1, %(reports)s) AS g;
+
+INSERT INTO iocs (report_id, value, type)
+SELECT r.report_id, '10.' || (r.report_id %% 250) || '.' || i || '.' || (r.report_id %% 200), 'IP'
+FROM reports r, generate_series(1, %(iocs_per_report)s) AS i;
+
+INSERT INTO ttps (report_id, technique_id, technique_name)
+SELECT r.report_id,
+       'T' || (1000 + (r.report_id * 7 + i) %% 600) || CASE WHEN i %% 2 = 0 THEN '.00' || i ELSE '' END,
+       'Technique ' || i
+FROM reports r, generate_series(1, %(ttps_per_report)s) AS i;
+"""
+
+# (label, baseline sql, migrated sql, params): the tools.py lookups written
+# against the baseline iocs/ttps tables, and as tools.py runs them on the
+# migrated schema. Migration 2 replaces ttps/iocs with report_techniques /
+# report_iocs, so the "indexed" column times the normalized tables and their
+# indexes, not migration 1's indexes on ttps (which migration 2 drops).
+QUERIES = [
+    ("search_by_victim (ILIKE)",
+     "SELECT report_id, filename, summary, created_at FROM reports WHERE victim_sector ILIKE %s",
+     "SELECT report_id, filename, summary, created_at FROM reports WHERE victim_sector ILIKE %s",
+     ("%health%",)),
+    ("technique exact ID",
+     "SELECT report_id, technique_name FROM ttps WHERE technique_id = %s OR technique_id LIKE %s",
+     "SELECT rt.report_id, t.name FROM report_techniques rt JOIN technique t USING (technique_id) "
+     "WHERE rt.technique_id = %s OR rt.technique_id LIKE %s",
+     ("T1566", "T1566.%")),
+    ("technique substring (ILIKE)",
+     "SELECT report_id, technique_name FROM ttps WHERE technique_id ILIKE %s",
+     "SELECT rt.report_id, t.name FROM report_techniques rt JOIN technique t USING (technique_id) "
+     "WHERE t.technique_id ILIKE %s",
+     ("%1566%",)),
+    ("iocs by report_id",
+     "SELECT type, value FROM iocs WHERE report_id = %s",
+     "SELECT d.type, d.value FROM report_iocs ri JOIN ioc d USING (ioc_id) WHERE ri.report_id = %s",
+     (4242,)),
+    ("reports sharing an IoC",
+     "SELECT DISTINCT b.report_id FROM iocs a JOIN iocs b ON b.type = a.type AND b.value = a.value "
+     "WHERE a.report_id = %s AND b.report_id <> a.report_id",
+     "SELECT DISTINCT b.report_id FROM report_iocs a JOIN report_iocs b USING (ioc_id) "
+     "WHERE a.report_id = %s AND b.report_id <> a.report_id",
+     (4242,)),
+    ("report by filename",
+     "SELECT raw_content, summary, victim_sector FROM reports WHERE filename = %s",
+     "SELECT raw_content, summary, victim_sector FROM reports WHERE filename = %s",
+     ("report_4242.txt",)),
+]
+
+
+def ensure_database():
+    conn = psycopg2.connect(dbname="postgres", **DB_CONFIG)
+    conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+    cur = conn.cursor()
+    cur.execute("SELECT 1 FROM pg_catalog.pg_database WHERE datname = %s", (BENCH_DB,))
+    if not cur.fetchone():
+        cur.execute(f"CREATE DATABASE {BENCH_DB}")
+    conn.close()
+
+
+def seed(conn, reports: int, iocs_per_report: int, ttps_per_report: int):
+    cur = conn.cursor()
+    cur.execute("DROP SCHEMA public CASCADE; CREATE SCHEMA public")
+    cur.execute(TABLE_SCHEMA)
+    started = time.perf_counter()
+    cur.execute(SEED_SQL, {
+        "reports": reports,
+        "iocs_per_report": iocs_per_report,
+        "ttps_per_report": ttps_per_report,
+    })
+    cur.execute("ANALYZE")
+    conn.commit()
+    print(f"Seeded {reports} reports in {time.perf_counter() - started:.1f}s")
+
+
+def time_queries(conn, repeat: int, migrated: bool) -> dict[str, float]:
+    """Median latency in milliseconds per query, in its baseline or migrated form."""
+    cur = conn.cursor()
+    timings = {}
+    for label, baseline_sql, migrated_sql, params in QUERIES:
+        sql = migrated_sql if migrated else baseline_sql
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            cur.execute(sql, params)
+            cur.fetchall()
+            samples.append((time.perf_counter() - started) * 1000)
+        conn.rollback()
+        timings[label] = statistics.median(samples)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--reports", type=int, default=100_000)
+    parser.add_argument("--iocs-per-report", type=int, default=10)
+    parser.add_argument("--ttps-per-report", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    ensure_database()
+    conn = psycopg2.connect(dbname=BENCH_DB, **DB_CONFIG)
+    seed(conn, args.reports, args.iocs_per_report, args.ttps_per_report)
+
+    before = time_queries(conn, args.repeat, migrated=False)
+    started = time.perf_counter()
+    apply_migrations(conn)
+    conn.cursor().execute("ANALYZE")
+    conn.commit()
+    print(f"Applied migrations in {time.perf_counter() - started:.1f}s")
+    after = time_queries(conn, args.repeat, migrated=True)
+    conn.close()
+
+    print(f"\n{'query':32} {'no index (ms)':>14} {'indexed (ms)':>14} {'speedup':>9}")
+    for label, *_ in QUERIES:
+        speedup = before[label] / after[label] if after[label] else float("inf")
+        print(f"{label:32} {before[label]:14.2f} {after[label]:14.2f} {speedup:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
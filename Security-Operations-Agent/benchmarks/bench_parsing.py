@@ -0,0 +1,61 @@
+"""
+Wall time and event-loop lag while parsing documents, on the event loop (the
+previous ingest_txt behaviour) versus document_parser.partition_document.
+
+A ticker task sleeps 10 ms in a loop next to the parsing; its worst overshoot
+is the stall a concurrent chat stream would see.
+
+    uv run python -m benchmarks.bench_parsing reports/*.pdf --copies 4
+"""
+
+import argparse
+import asyncio
+import time
+
+import document_parser
+
+
+async def ticker(lags: list[float]):
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(0.01)
+        lags.append(time.perf_counter() - started - 0.01)
+
+
+async def measure(label: str, parse, files: list[str]):
+    lags: list[float] = []
+    tick = asyncio.create_task(ticker(lags))
+    started = time.perf_counter()
+    results = await parse(files)
+    elapsed = time.perf_counter() - started
+    tick.cancel()
+    elements = sum(len(r) for r in results)
+    print(f"{label:28} {elapsed:8.2f}s  {elements:7} elements  max loop lag {max(lags, default=0) * 1000:8.1f} ms")
+
+
+async def on_event_loop(files):
+    return [document_parser._partition(f, f.split(".")[-1]) for f in files]
+
+
+async def in_process_pool(files):
+    return await asyncio.gather(*(document_parser.partition_document(f) for f in files))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("files", nargs="+", help=".pdf or .txt reports")
+    parser.add_argument("--copies", type=int, default=1, help="parse every file this many times")
+    args = parser.parse_args()
+    files = args.files * args.copies
+
+    print(f"{len(files)} documents, PARSER_WORKERS={document_parser.PARSER_WORKERS}, "
+          f"PDF_PAGES_PER_TASK={document_parser.PDF_PAGES_PER_TASK}")
+    await measure("on the event loop", on_event_loop, files)
+    # Warm the pool so process start-up is not counted
+    await document_parser.partition_document(files[0])
+    await measure("process pool", in_process_pool, files)
+    document_parser.shutdown_parser()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
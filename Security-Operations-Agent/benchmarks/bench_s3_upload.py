@@ -0,0 +1,108 @@
+"""
+S3 upload throughput against a local S3 stand-in (moto), comparing the
+previous upload path with the cached client, TransferConfig and async
+wrapper in utils.py.
+
+Starts moto's server on --port, points boto3 at it and runs:
+  1. --small uploads of a small file with a new client per call (the old
+     upload_file_to_s3) versus the cached client;
+  2. one --large-mb file with boto3's default TransferConfig versus
+     S3_TRANSFER_CONFIG;
+  3. --small concurrent uploads through upload_file_to_s3_async versus the
+     same uploads one after another.
+
+Requires moto's server extra, which is not a runtime dependency:
+    uv run --with "moto[server]" python -m benchmarks.bench_s3_upload
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from moto.server import ThreadedMotoServer
+
+BUCKET = "bench-uploads"
+
+
+def timed(label: str, func, count: int = 1):
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    print(f"{label:48} {elapsed:8.3f}s  ({count / elapsed:8.1f} uploads/s)")
+    return elapsed
+
+
+def make_file(directory: str, name: str, size: int) -> str:
+    path = os.path.join(directory, name)
+    with open(path, "wb") as f:
+        for _ in range(size // (1024 * 1024)):
+            f.write(os.urandom(1024 * 1024))
+        f.write(os.urandom(size % (1024 * 1024)))
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--small", type=int, default=50, help="number of small uploads")
+    parser.add_argument("--small-kb", type=int, default=256)
+    parser.add_argument("--large-mb", type=int, default=200)
+    args = parser.parse_args()
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = ThreadedMotoServer(port=args.port, verbose=False)
+    server.start()
+    os.environ["AWS_ENDPOINT_URL"] = f"http://127.0.0.1:{args.port}"
+
+    # Imported after AWS_ENDPOINT_URL is set so the cached client uses moto
+    import utils
+
+    try:
+        boto3.client("s3").create_bucket(Bucket=BUCKET)
+        with tempfile.TemporaryDirectory() as tmp:
+            small = make_file(tmp, "small.bin", args.small_kb * 1024)
+            large = make_file(tmp, "large.bin", args.large_mb * 1024 * 1024)
+
+            def client_per_call():
+                for i in range(args.small):
+                    boto3.client("s3").upload_file(small, BUCKET, f"old/{i}")
+
+            def cached_client():
+                for i in range(args.small):
+                    utils.upload_file_to_s3(small, BUCKET, f"new/{i}")
+
+            print(f"{args.small} x {args.small_kb} KB")
+            timed("  new client per upload", client_per_call, args.small)
+            timed("  cached client", cached_client, args.small)
+
+            print(f"1 x {args.large_mb} MB")
+            timed("  default TransferConfig",
+                  lambda: utils.get_s3_client().upload_file(large, BUCKET, "large/default", Config=TransferConfig()))
+            timed(f"  S3_TRANSFER_CONFIG ({utils.S3_PART_SIZE >> 20} MiB parts, "
+                  f"{utils.S3_MAX_CONCURRENCY} threads)",
+                  lambda: utils.upload_file_to_s3(large, BUCKET, "large/tuned"))
+
+            async def concurrent():
+                await asyncio.gather(*(
+                    utils.upload_file_to_s3_async(small, BUCKET, f"async/{i}") for i in range(args.small)
+                ))
+
+            print(f"{args.small} x {args.small_kb} KB from the event loop")
+            timed("  sequential", cached_client, args.small)
+            timed(f"  upload_file_to_s3_async ({utils.S3_UPLOAD_WORKERS} threads)",
+                  lambda: asyncio.run(concurrent()), args.small)
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+"""
+Append-only journal used as the on-disk format of the MemoryStore.
+
+Every mutation (thread / item / attachment upsert or delete) is written as a
+single JSON line to ``chat_history.journal``. Once enough records pile up the
+journal is folded into the ``chat_history.json`` snapshot (same layout the
+store has always written) and truncated. Startup reads the snapshot and then
+replays the journal on top of it.
+
+Records are idempotent upserts/deletes, so replaying a record twice (e.g. after
+a crash between writing the snapshot and truncating the journal) is harmless.
+
+Writes never happen on the caller's thread: ``submit`` only queues the record
+and a background writer thread flushes the queue every ``CHAT_STORE_FLUSH_INTERVAL``
+seconds. Records for the same key queued within one interval are coalesced, so
+a streamed assistant message costs one journal line per flush, not per update.
+
+With ``CHAT_STORE_MULTIPROCESS=1`` several processes (e.g. uvicorn workers) can
+share the same files. Appends and compaction then run under an exclusive
+``flock`` on ``chat_history.lock``, snapshots and the version file are replaced
+atomically, and every write bumps a ``generation version`` counter in
+``chat_history.version``. Each process compares that counter with the one it
+last saw and replays only the journal tail it has not read yet; a new
+generation (someone compacted) means a full reload.
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, single-process mode only
+    fcntl = None
+
+SNAPSHOT_FILE = "chat_history.json"
+JOURNAL_FILE = "chat_history.journal"
+LOCK_FILE = "chat_history.lock"
+VERSION_FILE = "chat_history.version"
+COMPACT_EVERY = int(os.environ.get("CHAT_JOURNAL_COMPACT_EVERY", "500"))
+FLUSH_INTERVAL = float(os.environ.get("CHAT_STORE_FLUSH_INTERVAL", "0.5"))
+MULTIPROCESS = os.environ.get("CHAT_STORE_MULTIPROCESS", "").lower() in ("1", "true", "yes")
+
+
+def empty_image() -> dict:
+    """Raw (JSON-ready) state: threads, items per thread keyed by id, attachments."""
+    return {"threads": {}, "items": {}, "attachments": {}}
+
+
+def apply_record(image: dict, record: dict) -> None:
+    """Applies a single journal record to a raw image in place."""
+    op = record["op"]
+    if op == "thread":
+        image["threads"][record["data"]["id"]] = record["data"]
+    elif op == "delete_thread":
+        image["threads"].pop(record["id"], None)
+        image["items"].pop(record["id"], None)
+    elif op == "item":
+        image["items"].setdefault(record["thread_id"], {})[record["data"]["id"]] = record["data"]
+    elif op == "delete_item":
+        image["items"].get(record["thread_id"], {}).pop(record["id"], None)
+    elif op == "attachment":
+        image["attachments"][record["data"]["id"]] = record["data"]
+    elif op == "delete_attachment":
+        image["attachments"].pop(record["id"], None)
+    else:
+        raise ValueError(f"Unknown journal op: {op}")
+
+
+def record_key(record: dict) -> tuple:
+    """
+    Key under which queued records are coalesced; a newer record for the same
+    key makes the older one redundant. delete_thread is kept apart from thread
+    upserts because it also drops the thread's items.
+    """
+    op = record["op"]
+    if op in ("item", "delete_item"):
+        item_id = record["data"]["id"] if op == "item" else record["id"]
+        return ("item", record["thread_id"], item_id)
+    if op in ("attachment", "delete_attachment"):
+        return ("attachment", record["data"]["id"] if op == "attachment" else record["id"])
+    if op == "thread":
+        return ("thread", record["data"]["id"])
+    return (op, record["id"])
+
+
+class ChatJournal:
+    def __init__(
+        self,
+        snapshot_path: str = SNAPSHOT_FILE,
+        journal_path: str = JOURNAL_FILE,
+        compact_every: int = COMPACT_EVERY,
+        flush_interval: float = FLUSH_INTERVAL,
+        shared: bool = MULTIPROCESS,
+        lock_path: str = LOCK_FILE,
+        version_path: str = VERSION_FILE,
+    ):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.compact_every = compact_every
+        self.flush_interval = flush_interval
+        self.shared = shared
+        self.version_path = version_path
+        self._journal_records = 0
+        self._known_signature = None
+
+        # Shared mode: position in the journal and counter we have caught up to.
+        self._offset = 0
+        self._generation: int | None = None
+        self._version = 0
+        self._lock_fd = None
+        if shared:
+            if fcntl is None:
+                raise RuntimeError("CHAT_STORE_MULTIPROCESS requires POSIX file locking")
+            self._lock_fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+
+        # Serializes file access between the writer thread and load()/reload.
+        # flock is per open file, so threads of one process also need this.
+        self._io_lock = threading.Lock()
+        # Guards the queue below and wakes the writer / flush() waiters.
+        self._cond = threading.Condition()
+        self._pending: dict[tuple, dict] = {}
+        self._writing = False
+        self._flush_requested = False
+        self._closed = False
+        self._writer: threading.Thread | None = None
+
+    def load(self) -> dict:
+        """Reads the snapshot and replays the journal. Returns the raw image."""
+        with self._locked(exclusive=False):
+            if self.shared:
+                self._generation, self._version = self._read_version()
+            image, replayed, self._offset = self._read_disk()
+            self._journal_records = replayed
+            self._known_signature = self._signature()
+        return image
+
+    def has_foreign_changes(self) -> bool:
+        """Shared mode: lock-free check of the version file against what we last saw."""
+        return self._read_version() != (self._generation, self._version)
+
+    def poll(self) -> list[dict] | None:
+        """
+        Shared mode: returns the records other processes appended since our last
+        read, or None if they compacted in the meantime and a full load() is needed.
+        """
+        with self._locked(exclusive=False):
+            generation, version = self._read_version()
+            records = self._read_tail(generation, version)
+            if records is not None:
+                self._version = version
+            return records
+
+    def changed_on_disk(self) -> bool:
+        """
+        True if the files were modified by someone other than this journal
+        since the last load/append. Costs two ``stat`` calls. Never blocks:
+        while our own writes are queued or in flight the in-memory state is
+        newer than the files anyway, so it reports no change.
+        """
+        with self._cond:
+            if self._pending or self._writing:
+                return False
+        if not self._io_lock.acquire(blocking=False):
+            return False
+        try:
+            return self._signature() != self._known_signature
+        finally:
+            self._io_lock.release()
+
+    def submit(self, record: dict) -> None:
+        """Queues a record for the background writer and returns immediately."""
+        key = record_key(record)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("ChatJournal is closed")
+            self._pending.pop(key, None)
+            self._pending[key] = record
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._writer_loop, name="chat-journal-writer", daemon=True
+                )
+                self._writer.start()
+                atexit.register(self.close)
+            self._cond.notify_all()
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Blocks until every queued record is on disk. Returns False on timeout."""
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            done = self._cond.wait_for(
+                lambda: not self._pending and not self._writing, timeout=timeout
+            )
+            self._flush_requested = False
+            return done
+
+    def close(self) -> None:
+        """Flushes and stops the writer thread."""
+        self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._writer is not None and self._writer is not threading.current_thread():
+            self._writer.join()
+
+    def append(self, records: list[dict]) -> list[dict] | None:
+        """
+        Appends records in one write; compacts once the journal grows past the threshold.
+
+        In shared mode this first catches up with the journal and returns the
+        records other processes appended before ours (None when they compacted
+        and the caller has to load() again). Single-process mode returns [].
+        """
+        data = "".join(json.dumps(record, default=str) + "\n" for record in records).encode("utf-8")
+        with self._locked(exclusive=True):
+            foreign = []
+            if self.shared:
+                generation, version = self._read_version()
+                foreign = self._read_tail(generation, version)
+
+            with open(self.journal_path, "ab") as f:
+                f.write(data)
+                end = f.tell()
+            self._journal_records += len(records)
+
+            if self.shared:
+                self._write_version(generation, version + 1)
+                if foreign is None:
+                    return None
+                self._offset = end
+                self._version = version + 1
+            else:
+                self._known_signature = self._signature()
+
+            if self._journal_records >= self.compact_every:
+                self._compact()
+        return foreign
+
+    def _writer_loop(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if self._closed and not self._pending:
+                    return
+                # Debounce: let more updates for the same keys coalesce.
+                self._cond.wait_for(
+                    lambda: self._flush_requested or self._closed,
+                    timeout=self.flush_interval,
+                )
+                batch, self._pending = self._pending, {}
+                self._writing = True
+
+            try:
+                self.append(list(batch.values()))
+                failed = False
+            except Exception as e:
+                print(f"Error saving chat history: {e}")
+                failed = True
+
+            with self._cond:
+                if failed:
+                    # Put the failed batch back in front of anything queued since;
+                    # newer records for the same key still win.
+                    for key, record in self._pending.items():
+                        batch.pop(key, None)
+                        batch[key] = record
+                    self._pending = batch
+                self._writing = False
+                self._cond.notify_all()
+            if failed:
+                time.sleep(self.flush_interval)
+
+    def compact(self) -> None:
+        """Folds the journal into a fresh snapshot and truncates the journal."""
+        with self._locked(exclusive=True):
+            self._compact()
+
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        with self._io_lock:
+            if not self.shared:
+                yield
+                return
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _read_version(self) -> tuple[int, int]:
+        try:
+            with open(self.version_path, "r", encoding="utf-8") as f:
+                generation, version = f.read().split()
+            return int(generation), int(version)
+        except FileNotFoundError:
+            return 0, 0
+
+    def _write_version(self, generation: int, version: int) -> None:
+        self._replace_file(self.version_path, f"{generation} {version}\n", fsync=False)
+
+    def _replace_file(self, path: str, text: str, fsync: bool = True) -> None:
+        """Atomic write: readers see either the old or the new file, never a partial one."""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _read_tail(self, generation: int, version: int) -> list[dict] | None:
+        """Records appended after our offset, or None if the journal was compacted under us."""
+        if generation != self._generation:
+            return None
+        if version == self._version:
+            return []
+        records, self._offset = self._read_journal(self._offset)
+        self._journal_records += len(records)
+        return records
+
+    def _compact(self) -> None:
+        image, _, _ = self._read_disk()
+        raw_data = {
+            "threads": image["threads"],
+            "items": {tid: list(items.values()) for tid, items in image["items"].items()},
+            "attachments": image["attachments"],
+        }
+        self._replace_file(self.snapshot_path, json.dumps(raw_data, indent=2, default=str))
+        # Truncate only after the snapshot is durable; a crash in between just
+        # replays already-applied records on the next start.
+        open(self.journal_path, "w", encoding="utf-8").close()
+        self._journal_records = 0
+        self._offset = 0
+        self._known_signature = self._signature()
+        if self.shared:
+            generation, version = self._read_version()
+            self._write_version(generation + 1, version + 1)
+            self._generation, self._version = generation + 1, version + 1
+
+    def _signature(self) -> tuple:
+        """(inode, size, mtime) of snapshot and journal; None for missing files."""
+        signature = []
+        for path in (self.snapshot_path, self.journal_path):
+            try:
+                st = os.stat(path)
+                signature.append((st.st_ino, st.st_size, st.st_mtime_ns))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _read_disk(self) -> tuple[dict, int, int]:
+        image = empty_image()
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            image["threads"] = data.get("threads", {})
+            image["items"] = {
+                tid: {i["id"]: i for i in i_list}
+                for tid, i_list in data.get("items", {}).items()
+            }
+            image["attachments"] = data.get("attachments", {})
+
+        records, offset = self._read_journal(0)
+        for record in records:
+            apply_record(image, record)
+        return image, len(records), offset
+
+    def _read_journal(self, offset: int) -> tuple[list[dict], int]:
+        """Parses complete journal lines from ``offset``. Returns records and the new offset."""
+        records = []
+        try:
+            f = open(self.journal_path, "rb")
+        except FileNotFoundError:
+            return records, 0
+        with f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Unterminated tail: a write cut short by a crash.
+                    break
+                offset += len(line)
+                if not line.strip():
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Torn write from a crash followed by later appends.
+                    print(f"Warning: Skipping corrupt journal record in {self.journal_path}")
+        return records, offset
@@ -1,41 +1,40 @@
 from typing import List, Dict, Optional, AsyncIterator, Any
+import os
 import uuid
-import json
-import re
-import traceback
 from datetime import datetime
 
-from agents import Runner
-from chatkit.agents import AgentContext, simple_to_agent_input, stream_agent_response
+from chatkit.agents import AgentContext, simple_to_agent_input
 from chatkit.server import ChatKitServer
+from chatkit.store import Store
 from chatkit.types import ThreadMetadata, ThreadStreamEvent, UserMessageItem, AssistantMessageItem, ThreadItemAddedEvent, ThreadItemDoneEvent, InferenceOptions
 from memory_store import MemoryStore
 from attachmentStore import BlobAttachmentStore
-from llmAgent import career_assistant
+from llmAgent import career_assistant, PARALLEL_TOOL_CALLS
 from utils import handling_wazuh_agent
+from react_loop import ToolLoop
+
+# Tools the assistant can call with a JSON array in its reply
+from tools import report_tools
+
+def build_store() -> Store[dict]:
+    """
+    Picks the chat history backend from CHAT_STORE_BACKEND:
+    "json" (default) for the journaled MemoryStore, "sqlite" for SQLiteStore.
+    """
+    backend = os.environ.get("CHAT_STORE_BACKEND", "json").lower()
+    if backend == "sqlite":
+        from sqlite_store import SQLiteStore
+        return SQLiteStore()
+    if backend != "json":
+        print(f"Warning: Unknown CHAT_STORE_BACKEND '{backend}', falling back to json")
+    return MemoryStore()
 
-# Import your tools so they can be executed inside the server
-from tools import (
-    get_file_content_raw, 
-    search_indicators_by_report_raw, 
-    search_by_victim_raw, 
-    get_reportsID_by_technique_raw, 
-    get_reports_by_reportID_raw
-)
-
-def sanitize_tool_json(json_str: str) -> str:
-    """Fix common JSON malformations from LLM output (e.g. leading/trailing commas)."""
-    # Remove leading comma after opening bracket: [, {...}] -> [{...}]
-    json_str = re.sub(r'\[\s*,', '[', json_str)
-    # Remove trailing comma before closing bracket: [{...},] -> [{...}]
-    json_str = re.sub(r',\s*\]', ']', json_str)
-    return json_str
 
 class MyAgentServer(ChatKitServer[dict[str, Any]]):
     """Server implementation that keeps conversation state in memory."""
 
     def __init__(self) -> None:
-        self.store: MemoryStore = MemoryStore()
+        self.store: Store[dict] = build_store()
         self.attachment_store: BlobAttachmentStore = BlobAttachmentStore(store=self.store)
         super().__init__(store=self.store, attachment_store=self.attachment_store)
 
@@ -116,122 +115,46 @@ class MyAgentServer(ChatKitServer[dict[str, Any]]):
                 
 
         # 3. Start the ReAct Loop (Max Turns)
-        max_turns = 10
-        
-        for turn in range(max_turns):
-            full_turn_response = ""
-            tool_calls_found = False
-            buffered_events = []  # Buffer events instead of yielding immediately
-
-            # Prepare Context
-            agent_context = AgentContext(
+        def new_item_id():
+            # A new ID for every chunk of text, so each assistant message is stored separately
+            item_id = f"msg_{uuid.uuid4().hex[:8]}"
+            context["forced_item_id"] = item_id
+            return item_id
+
+        def make_context():
+            return AgentContext(
                 thread=thread,
                 store=self.store,
                 attachment_store=self.attachment_store,
                 request_context=context,
             )
 
-            # Note: We pass the conversation_chain list directly as input
-            result = Runner.run_streamed(
-                career_assistant,
-                conversation_chain, 
-                context=agent_context,
-            )
-            
-            async for event in stream_agent_response(agent_context, result):
-                # Patch the stream events to use the forced ID
-                if hasattr(event, "item_id") and (event.item_id == "__fake_id__" or not event.item_id):
-                    event.item_id = forced_id
-                
-                # Capture text from thread.item.done events
-                if event.type == "thread.item.done" and hasattr(event, "item"):
-                    item_obj = event.item
-                    if hasattr(item_obj, "content") and item_obj.content:
-                        for part in item_obj.content:
-                            if hasattr(part, "text"):
-                                full_turn_response += part.text
-
-                buffered_events.append(event)
-            try:
-                match = re.search(r'(\[\s*\{\s*"name"\s*:\s*"(?:get_file_content|get_file_content_raw|search_indicators_by_report|search_indicators_by_report_raw|search_by_victim|search_by_victim_raw|get_reportsID_by_technique|get_reportsID_by_technique_raw|get_reports_by_reportID|get_reports_by_reportID_raw|wazuh_agent|analyse_wazuh_data|analyse_wazuh_data_raw)".*?\])', full_turn_response, re.DOTALL)
-                
-                if match:
-                    possible_json = match.group(1)
-                    possible_json = sanitize_tool_json(possible_json)
-                    print(f"Main Agent from line 150: {possible_json}")
-                    tool_calls = json.loads(possible_json)
-                    if isinstance(tool_calls, list):
-                        tool_calls_found = True
-                        
-                        # Only execute the FIRST tool call to enforce sequential reasoning.
-                        # The model must see one result before deciding the next step.
-                        call = tool_calls[0]
-                        res = "Error: Unknown tool"
-                        name = call.get("name", "")
-                        # Normalize: strip _raw suffix so both variants work
-                        if name.endswith("_raw"):
-                            name = name[:-4]
-                        args = call.get("arguments", {})
-                        
-                        try:
-                            if name == "search_indicators_by_report":
-                                res = await search_indicators_by_report_raw(**args)
-                            elif name == "get_file_content":
-                                res = await get_file_content_raw(**args)
-                            elif name == "search_by_victim":
-                                res = await search_by_victim_raw(**args)
-                            elif name == "get_reportsID_by_technique":
-                                res = await get_reportsID_by_technique_raw(**args)
-                            elif name == "get_reports_by_reportID":
-                                res = await get_reports_by_reportID_raw(**args)
-                            elif name == "wazuh_agent":
-                                wazuh_query = "Start Wazuh Analysis"
-                                # Generate a dedicated ID for wazuh events to avoid collision
-                                wazuh_forced_id = f"msg_{uuid.uuid4().hex[:8]}"
-                                try:
-                                    
-                                    async for event in handling_wazuh_agent(wazuh_query, agent_context):
-                                        # Patch item_id on wazuh events to match wazuh_forced_id
-                                        # LiteLLM assigns __fake_id__ which causes client to
-                                        # not associate streaming updates with the done event
-                                        if hasattr(event, "item_id"):
-                                            event.item_id = wazuh_forced_id
-                                        if hasattr(event, "item") and hasattr(event.item, "id"):
-                                            event.item.id = wazuh_forced_id
-                                        yield event
-                                    
-                                    # ChatKit's _process_events auto-saves ThreadItemDoneEvent
-                                    # so no explicit save_item needed here.
-                                    print("Wazuh streaming complete, exiting respond method")
-                                    return
-                                    
-                                except Exception as e:
-                                    print(f"Error running wazuh_agent: {e}")
-                                    traceback.print_exc()
-                                    res = f"Error during Wazuh Analysis: {e}"
-                        except Exception as tool_err:
-                            print(f"CRITICAL ERROR executing tool {name}: {tool_err}")
-                            traceback.print_exc()
-                            res = f"Tool Execution Error: {tool_err}"
-                        
-                        tool_outputs = [res]
-                        
-                        # Update Chain for next iteration
-                        conversation_chain.append({"role": "assistant", "content": full_turn_response})
-                        conversation_chain.append({"role": "user", "content": f"Tool Result [{name}]: {json.dumps(tool_outputs, default=str)}"})
-                        
-                        # Generate a NEW ID for the next chunk of text 
-                        forced_id = f"msg_{uuid.uuid4().hex[:8]}"
-                        context["forced_item_id"] = forced_id
-                        
-            except json.JSONDecodeError as e:
-                print(f"JSON Decode Error for tool call: {e}")
-                print(f"Failed JSON string: {possible_json}")
-            except Exception as e:
-                print(f"Error parsing tool call: {e}")
-                traceback.print_exc()
-
-            if not tool_calls_found:
-                for event in buffered_events:
-                    yield event
-                break
\ No newline at end of file
+        async def run_wazuh_agent(arguments, agent_context):
+            wazuh_query = "Start Wazuh Analysis"
+            # Generate a dedicated ID for wazuh events to avoid collision
+            wazuh_forced_id = f"msg_{uuid.uuid4().hex[:8]}"
+            async for event in handling_wazuh_agent(wazuh_query, agent_context):
+                # Patch item_id on wazuh events to match wazuh_forced_id
+                # LiteLLM assigns __fake_id__ which causes client to
+                # not associate streaming updates with the done event
+                if hasattr(event, "item_id"):
+                    event.item_id = wazuh_forced_id
+                if hasattr(event, "item") and hasattr(event.item, "id"):
+                    event.item.id = wazuh_forced_id
+                yield event
+            # ChatKit's _process_events auto-saves ThreadItemDoneEvent
+            # so no explicit save_item needed here.
+            print("Wazuh streaming complete, exiting respond method")
+
+        # Without PARALLEL_TOOL_CALLS only the first call of a turn runs, to
+        # enforce sequential reasoning: the model sees one result before deciding the next step.
+        tool_loop = ToolLoop(
+            career_assistant,
+            report_tools,
+            max_turns=10,
+            batch=PARALLEL_TOOL_CALLS,
+            streaming_tools={"wazuh_agent": run_wazuh_agent},
+            new_item_id=new_item_id,
+        )
+        async for event in tool_loop.run(conversation_chain, make_context):
+            yield event
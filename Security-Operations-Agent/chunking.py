@@ -0,0 +1,84 @@
+"""
+Splits partitioned reports into chunks for the vector store.
+
+unstructured returns one element per line, heading or table cell, far too
+small to embed one by one. chunk_elements groups them into sections that
+start at a Title element, then cuts each section into windows of
+CHUNK_TOKENS tokens overlapping by CHUNK_OVERLAP_TOKENS. Runs of headings
+and other tiny sections are merged into what follows them, and every window
+after the first repeats its section title.
+
+Tokens are whitespace-separated words; at the defaults a chunk stays well
+inside the 512-token window of mxbai-embed-large.
+"""
+
+import os
+import re
+
+CHUNK_TOKENS = int(os.environ.get("CHUNK_TOKENS", "256"))
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("CHUNK_OVERLAP_TOKENS", "32"))
+# Sections shorter than this are merged into the next one
+CHUNK_MIN_TOKENS = int(os.environ.get("CHUNK_MIN_TOKENS", "32"))
+
+ELEMENT_SEPARATOR = "\n\n"
+# Repeated on every page and useless for retrieval
+SKIPPED_CATEGORIES = {"Header", "Footer", "PageBreak"}
+
+_TOKEN = re.compile(r"\S+")
+
+
+def join_elements(elements: list[dict]) -> str:
+    """The report text that chunk offsets point into (stored as raw_content)."""
+    return ELEMENT_SEPARATOR.join(el["text"] for el in elements)
+
+
+def _sections(elements: list[dict]):
+    """Yields (title, tokens) per section; a token is (start, end, page) in join_elements' text."""
+    title, tokens = None, []
+    offset = 0
+    for el in elements:
+        text = el["text"]
+        start_of_element = offset
+        offset += len(text) + len(ELEMENT_SEPARATOR)
+        if el.get("category") in SKIPPED_CATEGORIES or not text.strip():
+            continue
+        if el.get("category") == "Title" and len(tokens) >= CHUNK_MIN_TOKENS:
+            yield title, tokens
+            title, tokens = None, []
+        if el.get("category") == "Title" and title is None and not tokens:
+            title = text.strip()
+        tokens.extend(
+            (start_of_element + m.start(), start_of_element + m.end(), el.get("page"))
+            for m in _TOKEN.finditer(text)
+        )
+    if tokens:
+        yield title, tokens
+
+
+def chunk_elements(elements: list[dict]) -> list[dict]:
+    """
+    Chunks partition_document output. Returns dicts with the chunk "text" and
+    its metadata: chunk_index, char_start/char_end (offsets into
+    join_elements(elements)) and page_start/page_end when pages are known.
+
+    args:
+        elements (list[dict]): {"text", "category", "page"} dicts in document order
+    """
+    text = join_elements(elements)
+    size = max(CHUNK_TOKENS, 1)
+    step = max(size - CHUNK_OVERLAP_TOKENS, 1)
+
+    chunks = []
+    for title, tokens in _sections(elements):
+        for first in range(0, max(len(tokens) - CHUNK_OVERLAP_TOKENS, 1), step):
+            window = tokens[first:first + size]
+            start, end = window[0][0], window[-1][1]
+            body = text[start:end]
+            if title and first > 0:
+                body = f"{title}{ELEMENT_SEPARATOR}{body}"
+            chunk = {"text": body, "chunk_index": len(chunks), "char_start": start, "char_end": end}
+            pages = [page for _, _, page in window if page is not None]
+            if pages:
+                chunk["page_start"], chunk["page_end"] = min(pages), max(pages)
+            chunks.append(chunk)
+    return chunks
@@ -1,6 +1,15 @@
+import asyncio
 import psycopg2
 import os
-from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+from psycopg.conninfo import make_conninfo
+from psycopg_pool import AsyncConnectionPool
+from psycopg2 import pool as pg_pool
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT, TRANSACTION_STATUS_IDLE
+from psycopg2.extras import execute_values
 
 # Configuration
 DB_CONFIG = {
@@ -11,10 +20,588 @@ DB_CONFIG = {
 }
 TARGET_DB = os.environ.get("TARGET_DB")
 
+# Connection pool settings
+DB_POOL_MIN = int(os.environ.get("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.environ.get("DB_POOL_MAX", "10"))
+# Seconds to wait for a free connection before giving up
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+# Connections idle longer than this are pinged with SELECT 1 before reuse
+DB_POOL_HEALTHCHECK_AFTER = float(os.environ.get("DB_POOL_HEALTHCHECK_AFTER", "30"))
+
+_pool = None
+_pool_lock = threading.Lock()
+_metrics_lock = threading.Lock()
+# Caps concurrent checkouts at DB_POOL_MAX; psycopg2's pool raises instead of waiting
+_pool_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+_last_used: dict[int, float] = {}
+_pool_metrics = {
+    "checkouts": 0,
+    "in_use": 0,
+    "waits": 0,
+    "wait_seconds": 0.0,
+    "timeouts": 0,
+    "health_checks": 0,
+    "discarded": 0,
+}
+
+
+def _count(metric: str, amount=1):
+    with _metrics_lock:
+        _pool_metrics[metric] += amount
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = pg_pool.ThreadedConnectionPool(
+                    DB_POOL_MIN, DB_POOL_MAX, dbname=TARGET_DB, **DB_CONFIG
+                )
+    return _pool
+
+
+def _is_healthy(conn) -> bool:
+    if conn.closed:
+        return False
+    last_used = _last_used.get(id(conn))
+    if last_used is None or time.monotonic() - last_used < DB_POOL_HEALTHCHECK_AFTER:
+        # Fresh connections and recently used ones skip the round-trip
+        return True
+    _count("health_checks")
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def _release(pool, conn):
+    discard = conn.closed or conn.get_transaction_status() != TRANSACTION_STATUS_IDLE
+    if discard:
+        _count("discarded")
+        _last_used.pop(id(conn), None)
+    else:
+        _last_used[id(conn)] = time.monotonic()
+    pool.putconn(conn, close=discard)
+
+
+@contextmanager
+def get_connection(autocommit: bool = False):
+    """
+    Borrows a connection to TARGET_DB from the process-wide pool.
+
+    Blocks up to DB_POOL_TIMEOUT seconds when all DB_POOL_MAX connections are
+    in use. Work that was not committed is rolled back on release; broken
+    connections are closed instead of going back to the pool.
+
+    args:
+        autocommit (bool): Run each statement in its own transaction. Use for
+            read-only lookups so releasing the connection needs no ROLLBACK.
+    """
+    pool = _get_pool()
+    started = time.monotonic()
+    if not _pool_slots.acquire(blocking=False):
+        _count("waits")
+        if not _pool_slots.acquire(timeout=DB_POOL_TIMEOUT):
+            _count("timeouts")
+            raise pg_pool.PoolError("Timed out waiting for a database connection")
+        _count("wait_seconds", time.monotonic() - started)
+
+    try:
+        conn = pool.getconn()
+        while not _is_healthy(conn):
+            _count("discarded")
+            _last_used.pop(id(conn), None)
+            pool.putconn(conn, close=True)
+            conn = pool.getconn()
+        conn.autocommit = autocommit
+        _count("checkouts")
+        _count("in_use")
+        try:
+            yield conn
+        finally:
+            _count("in_use", -1)
+            if not conn.closed and conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    pass
+            _release(pool, conn)
+    finally:
+        _pool_slots.release()
+
+
+def pool_stats() -> dict:
+    """Counters for the connection pool, suitable for a metrics endpoint."""
+    with _metrics_lock:
+        return {"min": DB_POOL_MIN, "max": DB_POOL_MAX, **_pool_metrics}
+
+
+def close_pool():
+    """Closes every pooled connection. Call on shutdown."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+        _last_used.clear()
+
+
+# --- Async pool (psycopg 3) for code running on the event loop ---
+
+_async_pool: AsyncConnectionPool | None = None
+_async_pool_lock = asyncio.Lock()
+_async_last_used = weakref.WeakKeyDictionary()
+
+
+async def _check_async_connection(conn):
+    """Pings connections that sat idle long enough to have been dropped."""
+    last_used = _async_last_used.get(conn)
+    if last_used is not None and time.monotonic() - last_used >= DB_POOL_HEALTHCHECK_AFTER:
+        await AsyncConnectionPool.check_connection(conn)
+
+
+async def _mark_async_returned(conn):
+    _async_last_used[conn] = time.monotonic()
+
+
+async def get_async_pool() -> AsyncConnectionPool:
+    global _async_pool
+    if _async_pool is None:
+        async with _async_pool_lock:
+            if _async_pool is None:
+                pool = AsyncConnectionPool(
+                    make_conninfo(dbname=TARGET_DB, **DB_CONFIG),
+                    min_size=DB_POOL_MIN,
+                    max_size=DB_POOL_MAX,
+                    timeout=DB_POOL_TIMEOUT,
+                    kwargs={"autocommit": True},
+                    check=_check_async_connection,
+                    reset=_mark_async_returned,
+                    open=False,
+                )
+                await pool.open()
+                _async_pool = pool
+    return _async_pool
+
+
+@asynccontextmanager
+async def get_async_connection():
+    """
+    Borrows an autocommit connection from the async pool. Queries on it
+    await the network instead of blocking the event loop, so concurrent chat
+    streams keep flowing while a slow lookup runs.
+    """
+    pool = await get_async_pool()
+    async with pool.connection() as conn:
+        yield conn
+
+
+def async_pool_stats() -> dict:
+    """Counters reported by psycopg_pool (requests, waits, errors, ...)."""
+    if _async_pool is None:
+        return {}
+    return _async_pool.get_stats()
+
+
+async def close_async_pool():
+    global _async_pool
+    if _async_pool is not None:
+        await _async_pool.close()
+        _async_pool = None
+
+
+# --- Bulk writes for ingestion ---
+
+# Rows per multi-row INSERT statement
+BULK_PAGE_SIZE = int(os.environ.get("DB_BULK_PAGE_SIZE", "1000"))
+
+
+def insert_report_iocs(cur, report_id: int, iocs) -> int:
+    """
+    Links (type, value) pairs to a report with set-based INSERTs, creating
+    missing ioc rows first. Duplicates within the report are dropped, and
+    rows are sorted so concurrent ingests lock ioc rows in the same order.
+    Runs in the caller's transaction. Returns the number of distinct IoCs.
+    """
+    rows = sorted({
+        ((ioc_type or "").strip(), value.strip())
+        for ioc_type, value in iocs
+        if value and value.strip()
+    })
+    if not rows:
+        return 0
+    execute_values(
+        cur,
+        "INSERT INTO ioc (type, value) VALUES %s ON CONFLICT (type, value) DO NOTHING",
+        rows,
+        page_size=BULK_PAGE_SIZE,
+    )
+    execute_values(
+        cur,
+        """
+        INSERT INTO report_iocs (report_id, ioc_id)
+        SELECT v.report_id, d.ioc_id
+        FROM (VALUES %s) AS v (report_id, type, value)
+        JOIN ioc d ON d.type = v.type AND d.value = v.value
+        ON CONFLICT DO NOTHING
+        """,
+        [(report_id, ioc_type, value) for ioc_type, value in rows],
+        page_size=BULK_PAGE_SIZE,
+    )
+    return len(rows)
+
+
+def insert_report_techniques(cur, report_id: int, ttps) -> int:
+    """
+    Links (technique_id, name) pairs to a report, creating missing technique
+    rows first. IDs are upper-cased and deduplicated; the first name seen for
+    an ID wins. Runs in the caller's transaction. Returns the number of
+    distinct techniques.
+    """
+    names: dict[str, str] = {}
+    for technique_id, name in ttps:
+        key = (technique_id or "").strip().upper()
+        if key:
+            names.setdefault(key, name)
+    if not names:
+        return 0
+    rows = sorted(names.items())
+    execute_values(
+        cur,
+        "INSERT INTO technique (technique_id, name) VALUES %s ON CONFLICT (technique_id) DO NOTHING",
+        rows,
+        page_size=BULK_PAGE_SIZE,
+    )
+    execute_values(
+        cur,
+        "INSERT INTO report_techniques (report_id, technique_id) VALUES %s ON CONFLICT DO NOTHING",
+        [(report_id, key) for key, _ in rows],
+        page_size=BULK_PAGE_SIZE,
+    )
+    return len(rows)
+
+
+def bump_result_generation(cur):
+    """
+    Invalidates the cached tool results of every server process (see
+    result_cache). Runs in the caller's transaction, so it takes effect when
+    the new report commits.
+    """
+    cur.execute("UPDATE result_cache_generation SET generation = generation + 1")
+
+
+# Define the Schema (Using IF NOT EXISTS for safety)
+# This is the baseline; MIGRATIONS below evolve it (iocs and ttps become views).
+# Remove the raw_content column. No need to store the raw content in the database as report is stored in S3.
+TABLE_SCHEMA = """
+-- 1. Reports Table
+CREATE TABLE IF NOT EXISTS reports (
+    report_id SERIAL PRIMARY KEY,
+    filename VARCHAR(255),
+    summary TEXT,
+    severity VARCHAR(50),
+    victim_sector VARCHAR(100),
+    timeline_start VARCHAR(100),
+    timeline_end VARCHAR(100),
+    raw_content TEXT,   
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 2. Indicators (IoCs)
+CREATE TABLE IF NOT EXISTS iocs (
+    ioc_id SERIAL PRIMARY KEY,
+    report_id INT REFERENCES reports(report_id) ON DELETE CASCADE,
+    value VARCHAR(255),
+    type VARCHAR(50)
+);
+
+-- 3. TTPs (MITRE)
+CREATE TABLE IF NOT EXISTS ttps (
+    ttp_id SERIAL PRIMARY KEY,
+    report_id INT REFERENCES reports(report_id) ON DELETE CASCADE,
+    technique_id VARCHAR(50),
+    technique_name VARCHAR(100)
+);
+"""
+
+# Ordered, append-only list of (version, description, sql). Each migration runs
+# once in its own transaction and is recorded in schema_migrations; never edit
+# an applied migration, add a new version instead.
+MIGRATIONS = [
+    # The ttps indexes created here go away with the ttps table in migration 2,
+    # which indexes report_techniques / technique instead
+    (1, "Lookup indexes for reports, iocs and ttps", """
+    -- Foreign keys and exact filename lookups
+    CREATE INDEX IF NOT EXISTS idx_iocs_report_id ON iocs (report_id);
+    CREATE INDEX IF NOT EXISTS idx_ttps_report_id ON ttps (report_id);
+    CREATE INDEX IF NOT EXISTS idx_reports_filename ON reports (filename);
+
+    -- Canonical technique IDs (T1566, T1566.001): equality and prefix match
+    CREATE INDEX IF NOT EXISTS idx_ttps_technique_id_upper
+        ON ttps (upper(technique_id) text_pattern_ops);
+
+    -- Substring (ILIKE '%x%') search on sector and technique
+    DO $$
+    BEGIN
+        IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+            CREATE EXTENSION IF NOT EXISTS pg_trgm;
+            CREATE INDEX IF NOT EXISTS idx_reports_victim_sector_trgm
+                ON reports USING gin (victim_sector gin_trgm_ops);
+            CREATE INDEX IF NOT EXISTS idx_ttps_technique_id_trgm
+                ON ttps USING gin (technique_id gin_trgm_ops);
+        ELSE
+            RAISE WARNING 'pg_trgm is not available; sector and technique substring searches will use sequential scans';
+        END IF;
+    END
+    $$;
+    """),
+    (2, "Normalize IoCs and TTPs into dimension tables; typed timelines; unique filename and content hash", """
+    -- Safe text -> timestamptz cast: free-form extractor output becomes NULL
+    CREATE OR REPLACE FUNCTION try_timestamptz(value TEXT) RETURNS TIMESTAMPTZ AS $$
+    BEGIN
+        RETURN value::timestamptz;
+    EXCEPTION WHEN others THEN
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql STABLE;
+
+    -- One row per distinct IoC / technique across the whole corpus
+    CREATE TABLE ioc (
+        ioc_id BIGSERIAL PRIMARY KEY,
+        type VARCHAR(50) NOT NULL DEFAULT '',
+        value TEXT NOT NULL,
+        UNIQUE (type, value)
+    );
+
+    CREATE TABLE technique (
+        technique_id VARCHAR(50) PRIMARY KEY,
+        name VARCHAR(255)
+    );
+
+    CREATE TABLE report_iocs (
+        report_id INT NOT NULL REFERENCES reports(report_id) ON DELETE CASCADE,
+        ioc_id BIGINT NOT NULL REFERENCES ioc(ioc_id) ON DELETE CASCADE,
+        PRIMARY KEY (report_id, ioc_id)
+    );
+    -- Cross-report correlation: which reports share this IoC
+    CREATE INDEX idx_report_iocs_ioc_id ON report_iocs (ioc_id);
+
+    CREATE TABLE report_techniques (
+        report_id INT NOT NULL REFERENCES reports(report_id) ON DELETE CASCADE,
+        technique_id VARCHAR(50) NOT NULL REFERENCES technique(technique_id),
+        PRIMARY KEY (report_id, technique_id)
+    );
+    -- Exact ID and sub-technique prefix (T1566.%) lookups
+    CREATE INDEX idx_report_techniques_technique_id
+        ON report_techniques (technique_id text_pattern_ops);
+
+    -- Backfill from the per-report rows
+    INSERT INTO ioc (type, value)
+    SELECT DISTINCT COALESCE(type, ''), value FROM iocs WHERE value IS NOT NULL
+    ON CONFLICT DO NOTHING;
+
+    INSERT INTO report_iocs (report_id, ioc_id)
+    SELECT DISTINCT i.report_id, d.ioc_id
+    FROM iocs i JOIN ioc d ON d.type = COALESCE(i.type, '') AND d.value = i.value
+    WHERE i.report_id IS NOT NULL;
+
+    INSERT INTO technique (technique_id, name)
+    SELECT upper(trim(technique_id)), mode() WITHIN GROUP (ORDER BY technique_name)
+    FROM ttps WHERE NULLIF(trim(technique_id), '') IS NOT NULL
+    GROUP BY 1;
+
+    INSERT INTO report_techniques (report_id, technique_id)
+    SELECT DISTINCT report_id, upper(trim(technique_id))
+    FROM ttps WHERE report_id IS NOT NULL AND NULLIF(trim(technique_id), '') IS NOT NULL;
+
+    -- The old tables live on as read-only views for ad-hoc queries
+    DROP TABLE iocs;
+    DROP TABLE ttps;
+    CREATE VIEW iocs AS
+        SELECT ri.report_id, d.ioc_id, d.value, d.type
+        FROM report_iocs ri JOIN ioc d USING (ioc_id);
+    CREATE VIEW ttps AS
+        SELECT rt.report_id, t.technique_id, t.name AS technique_name
+        FROM report_techniques rt JOIN technique t USING (technique_id);
+
+    -- Substring (ILIKE '%x%') search on technique IDs; replaces the ttps
+    -- indexes from migration 1, which went away with the ttps table
+    DO $$
+    BEGIN
+        IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+            CREATE EXTENSION IF NOT EXISTS pg_trgm;
+            CREATE INDEX IF NOT EXISTS idx_technique_technique_id_trgm
+                ON technique USING gin (technique_id gin_trgm_ops);
+        ELSE
+            RAISE WARNING 'pg_trgm is not available; technique substring searches will use sequential scans';
+        END IF;
+    END
+    $$;
+
+    -- Typed timelines; the extractor's original text is kept in timeline_raw
+    ALTER TABLE reports ADD COLUMN timeline_raw TEXT;
+    UPDATE reports SET timeline_raw = concat_ws(' / ', timeline_start, timeline_end)
+    WHERE timeline_start IS NOT NULL OR timeline_end IS NOT NULL;
+    ALTER TABLE reports
+        ALTER COLUMN timeline_start TYPE TIMESTAMPTZ USING try_timestamptz(timeline_start),
+        ALTER COLUMN timeline_end TYPE TIMESTAMPTZ USING try_timestamptz(timeline_end);
+
+    -- One report per filename: later duplicates are renamed, never deleted
+    -- (truncated so the suffix still fits in VARCHAR(255))
+    UPDATE reports r SET filename = left(r.filename, 255 - length(' (' || r.report_id || ')'))
+                                    || ' (' || r.report_id || ')'
+    FROM (
+        SELECT report_id, row_number() OVER (PARTITION BY filename ORDER BY report_id) AS n
+        FROM reports WHERE filename IS NOT NULL
+    ) d
+    WHERE r.report_id = d.report_id AND d.n > 1;
+    ALTER TABLE reports ADD CONSTRAINT reports_filename_key UNIQUE (filename);
+    DROP INDEX IF EXISTS idx_reports_filename;
+
+    -- SHA-256 of raw_content; only the oldest copy of duplicated content keeps it
+    ALTER TABLE reports ADD COLUMN content_hash CHAR(64);
+    UPDATE reports r SET content_hash = h.hash
+    FROM (
+        SELECT report_id, hash, row_number() OVER (PARTITION BY hash ORDER BY report_id) AS n
+        FROM (
+            SELECT report_id, encode(sha256(convert_to(raw_content, 'UTF8')), 'hex') AS hash
+            FROM reports WHERE raw_content IS NOT NULL
+        ) s
+    ) h
+    WHERE r.report_id = h.report_id AND h.n = 1;
+    ALTER TABLE reports ADD CONSTRAINT reports_content_hash_key UNIQUE (content_hash);
+    """),
+    (3, "Durable ingestion job queue", """
+    CREATE TABLE ingestion_jobs (
+        job_id BIGSERIAL PRIMARY KEY,
+        filename VARCHAR(255) NOT NULL,
+        file_path TEXT NOT NULL,
+        content_hash CHAR(64),
+        status VARCHAR(20) NOT NULL DEFAULT 'queued',  -- queued, running, succeeded, failed
+        stage VARCHAR(50),
+        attempts INT NOT NULL DEFAULT 0,
+        max_attempts INT NOT NULL DEFAULT 3,
+        error TEXT,
+        s3_url TEXT,
+        report_id INT REFERENCES reports(report_id) ON DELETE SET NULL,
+        run_after TIMESTAMPTZ NOT NULL DEFAULT now(),
+        lease_expires TIMESTAMPTZ,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        finished_at TIMESTAMPTZ
+    );
+    -- Claim order for workers; finished jobs drop out of the index
+    CREATE INDEX idx_ingestion_jobs_pending
+        ON ingestion_jobs (run_after, job_id) WHERE status IN ('queued', 'running');
+
+    -- At most one pending job per file name and per content: concurrent
+    -- uploads of the same file conflict here (enqueue uses ON CONFLICT)
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_ingestion_jobs_pending_filename
+        ON ingestion_jobs (filename) WHERE status IN ('queued', 'running');
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_ingestion_jobs_pending_content_hash
+        ON ingestion_jobs (content_hash) WHERE status IN ('queued', 'running');
+    """),
+    (4, "Generation counter for cached tool results, shared by all server processes", """
+    CREATE TABLE result_cache_generation (
+        id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),  -- exactly one row
+        generation BIGINT NOT NULL DEFAULT 0
+    );
+    INSERT INTO result_cache_generation DEFAULT VALUES;
+    """),
+    # Migration 2 creates this index too; this adds it where 2 ran before it did
+    (5, "Trigram index on technique IDs for the ILIKE technique search", """
+    -- Substring (ILIKE '%x%') search on technique IDs; replaces the ttps
+    -- indexes from migration 1, which went away with the ttps table
+    DO $$
+    BEGIN
+        IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+            CREATE EXTENSION IF NOT EXISTS pg_trgm;
+            CREATE INDEX IF NOT EXISTS idx_technique_technique_id_trgm
+                ON technique USING gin (technique_id gin_trgm_ops);
+        ELSE
+            RAISE WARNING 'pg_trgm is not available; technique substring searches will use sequential scans';
+        END IF;
+    END
+    $$;
+    """),
+    # Migration 2 backfilled content_hash with sha256(raw_content), but ingestion
+    # stores the SHA-256 of the uploaded file, so old values never match a re-upload
+    (6, "content_hash is the SHA-256 of the uploaded file only; clear backfilled raw_content hashes", """
+    UPDATE reports SET content_hash = NULL
+    WHERE content_hash = encode(sha256(convert_to(raw_content, 'UTF8')), 'hex')
+      AND created_at < (SELECT applied_at FROM schema_migrations WHERE version = 2);
+    COMMENT ON COLUMN reports.content_hash IS 'SHA-256 of the uploaded file bytes (vectorstore.file_sha256)';
+    """),
+    # Migration 3 creates these indexes too; this adds them where 3 ran before it did.
+    # Duplicate pending jobs from before are failed first, keeping the oldest.
+    (7, "One pending ingestion job per file name and per content hash", """
+    UPDATE ingestion_jobs j
+    SET status = 'failed', stage = 'failed', error = 'Duplicate of job ' || d.first_job_id,
+        lease_expires = NULL, finished_at = now(), updated_at = now()
+    FROM (
+        SELECT job_id,
+               least(min(job_id) OVER (PARTITION BY filename),
+                     CASE WHEN content_hash IS NULL THEN job_id
+                          ELSE min(job_id) OVER (PARTITION BY content_hash) END) AS first_job_id
+        FROM ingestion_jobs WHERE status IN ('queued', 'running')
+    ) d
+    WHERE j.job_id = d.job_id AND d.job_id <> d.first_job_id;
+
+    -- At most one pending job per file name and per content: concurrent
+    -- uploads of the same file conflict here (enqueue uses ON CONFLICT)
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_ingestion_jobs_pending_filename
+        ON ingestion_jobs (filename) WHERE status IN ('queued', 'running');
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_ingestion_jobs_pending_content_hash
+        ON ingestion_jobs (content_hash) WHERE status IN ('queued', 'running');
+    """),
+]
+
+# Arbitrary key for pg_advisory_lock so concurrent init_db calls migrate once
+MIGRATION_LOCK_ID = 7235001
+
+
+def apply_migrations(conn):
+    """Applies pending MIGRATIONS in version order."""
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMPTZ DEFAULT now()
+        )
+    """)
+    conn.commit()
+    cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+    try:
+        cur.execute("SELECT version FROM schema_migrations")
+        applied = {row[0] for row in cur.fetchall()}
+        for version, description, sql in MIGRATIONS:
+            if version in applied:
+                continue
+            cur.execute(sql)
+            cur.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                (version, description),
+            )
+            conn.commit()
+            print(f"Applied migration {version}: {description}")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+        conn.commit()
+
+
 def init_db():
     """
     1. Checks if the database 'siem_db' exists; creates it if not.
     2. Connects to 'siem_db' and creates the required tables.
+    3. Applies pending schema migrations (indexes, normalized IoC/TTP tables, ...).
     """
     
     conn = psycopg2.connect(dbname="postgres", **DB_CONFIG)
@@ -39,43 +626,11 @@ def init_db():
     conn = psycopg2.connect(dbname=TARGET_DB, **DB_CONFIG)
     cur = conn.cursor()
     
-    # Define the Schema (Using IF NOT EXISTS for safety)
-    # Remove the raw_content column. No need to store the raw content in the database as report is stored in S3.
-    table_schema = """
-    -- 1. Reports Table
-    CREATE TABLE IF NOT EXISTS reports (
-        report_id SERIAL PRIMARY KEY,
-        filename VARCHAR(255),
-        summary TEXT,
-        severity VARCHAR(50),
-        victim_sector VARCHAR(100),
-        timeline_start VARCHAR(100),
-        timeline_end VARCHAR(100),
-        raw_content TEXT,   
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    );
-
-    -- 2. Indicators (IoCs)
-    CREATE TABLE IF NOT EXISTS iocs (
-        ioc_id SERIAL PRIMARY KEY,
-        report_id INT REFERENCES reports(report_id) ON DELETE CASCADE,
-        value VARCHAR(255),
-        type VARCHAR(50)
-    );
-
-    -- 3. TTPs (MITRE)
-    CREATE TABLE IF NOT EXISTS ttps (
-        ttp_id SERIAL PRIMARY KEY,
-        report_id INT REFERENCES reports(report_id) ON DELETE CASCADE,
-        technique_id VARCHAR(50),
-        technique_name VARCHAR(100)
-    );
-    """
-    
     try:
-        cur.execute(table_schema)
+        cur.execute(TABLE_SCHEMA)
         conn.commit()
         print("Schema initialized successfully (Tables created/verified).")
+        apply_migrations(conn)
     except Exception as e:
         print(f"Error creating schema: {e}")
         conn.rollback()
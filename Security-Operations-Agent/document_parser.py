@@ -0,0 +1,194 @@
+"""
+Document partitioning off the event loop.
+
+unstructured's partitioners are CPU-bound and hold the GIL, so running them
+on the server's event loop stalls every chat stream while a PDF is parsed.
+partition_document runs them in a process pool instead: large PDFs are split
+into page ranges that are parsed in parallel, and every document gets a
+timeout.
+
+This module is imported by the pool's worker processes, so keep its
+top-level imports light.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import signal
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# Parser processes per server process
+PARSER_WORKERS = int(os.environ.get("PARSER_WORKERS", str(os.cpu_count() or 2)))
+# PDFs with more pages than this are split into ranges of this many pages
+PDF_PAGES_PER_TASK = int(os.environ.get("PDF_PAGES_PER_TASK", "10"))
+# Seconds allowed for partitioning one document
+PARSE_TIMEOUT = float(os.environ.get("PARSE_TIMEOUT", "600"))
+
+_pool = None  # the _ParserPool new documents go to
+_retired = set()  # pools stopped after a timeout, waiting for their other documents
+_pool_lock = threading.Lock()
+
+
+class ParseTimeout(Exception):
+    """Raised when a document takes longer than PARSE_TIMEOUT to partition."""
+
+
+# --- Runs in the worker processes ---
+
+def _report_pid(pids):
+    """Pool initializer: tells the server process which PIDs belong to the pool."""
+    pids.put(os.getpid())
+
+
+def _pdf_page_count(file_path: str) -> int:
+    from pypdf import PdfReader
+
+    return len(PdfReader(file_path).pages)
+
+
+def _write_page_range(file_path: str, first_page: int, last_page: int, out_path: str):
+    from pypdf import PdfReader, PdfWriter
+
+    reader = PdfReader(file_path)
+    writer = PdfWriter()
+    for page in reader.pages[first_page:last_page]:
+        writer.add_page(page)
+    with open(out_path, "wb") as f:
+        writer.write(f)
+
+
+def _partition(file_path: str, file_type: str, first_page: int | None = None, last_page: int | None = None) -> list[dict]:
+    """
+    Partitions a file, or pages [first_page, last_page) of a PDF, into
+    {"text", "category", "page"} dicts. Plain dicts keep the results cheap to
+    send back to the parent process.
+    """
+    if file_type == "pdf":
+        from unstructured.partition.pdf import partition_pdf
+
+        if first_page is None:
+            elements = partition_pdf(filename=file_path, strategy="auto")
+        else:
+            with tempfile.TemporaryDirectory() as tmp:
+                part_path = os.path.join(tmp, "pages.pdf")
+                _write_page_range(file_path, first_page, last_page, part_path)
+                elements = partition_pdf(
+                    filename=part_path, strategy="auto", starting_page_number=first_page + 1
+                )
+    else:
+        from unstructured.partition.text import partition_text
+
+        elements = partition_text(filename=file_path)
+
+    return [
+        {"text": el.text, "category": el.category, "page": el.metadata.page_number}
+        for el in elements
+    ]
+
+
+# --- Runs in the server process ---
+
+class _ParserPool:
+    """A process pool, the PIDs of its workers and how many documents are using it."""
+
+    def __init__(self):
+        # spawn, not fork: the server process runs threads (DB pool, S3 uploads)
+        context = multiprocessing.get_context("spawn")
+        self._pids = context.SimpleQueue()
+        self.executor = ProcessPoolExecutor(
+            max_workers=PARSER_WORKERS, mp_context=context, initializer=_report_pid, initargs=(self._pids,)
+        )
+        self.documents = 0
+        self.retired = False
+
+    def terminate(self):
+        """Stops the pool and kills its workers, including one stuck in a partition."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        while not self._pids.empty():
+            try:
+                os.kill(self._pids.get(), signal.SIGTERM)
+            except (ProcessLookupError, PermissionError):
+                pass
+
+
+def _acquire_pool() -> _ParserPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = _ParserPool()
+        _pool.documents += 1
+        return _pool
+
+
+def _release_pool(pool: _ParserPool, timed_out: bool):
+    """
+    A running partition cannot be cancelled, so after a timeout the pool is
+    retired: new documents go to a fresh pool, and the old one is terminated
+    once the documents still parsing on it are done. Those are not failed
+    by another document's timeout.
+    """
+    global _pool
+    with _pool_lock:
+        pool.documents -= 1
+        if timed_out and not pool.retired:
+            pool.retired = True
+            _retired.add(pool)
+            if _pool is pool:
+                _pool = None
+        finished = pool.retired and pool.documents == 0
+        if finished:
+            _retired.discard(pool)
+    if finished:
+        pool.terminate()
+
+
+async def partition_document(file_path: str) -> list[dict]:
+    """
+    Partitions a .pdf or text file in the parser pool and returns its
+    elements as {"text", "category", "page"} dicts in document order.
+
+    Raises ParseTimeout after PARSE_TIMEOUT seconds.
+    """
+    file_type = file_path.split(".")[-1]
+    loop = asyncio.get_running_loop()
+    pool = _acquire_pool()
+    timed_out = False
+
+    def run(func, *args):
+        return loop.run_in_executor(pool.executor, func, *args)
+
+    try:
+        async with asyncio.timeout(PARSE_TIMEOUT):
+            if file_type == "pdf":
+                pages = await run(_pdf_page_count, file_path)
+                if pages > PDF_PAGES_PER_TASK:
+                    ranges = [
+                        (first, min(first + PDF_PAGES_PER_TASK, pages))
+                        for first in range(0, pages, PDF_PAGES_PER_TASK)
+                    ]
+                    print(f"Parsing {file_path}: {pages} pages in {len(ranges)} parallel ranges")
+                    parts = await asyncio.gather(
+                        *(run(_partition, file_path, file_type, first, last) for first, last in ranges)
+                    )
+                    return [element for part in parts for element in part]
+            return await run(_partition, file_path, file_type)
+    except TimeoutError:
+        timed_out = True
+        raise ParseTimeout(f"Parsing {file_path} took longer than {PARSE_TIMEOUT:.0f}s")
+    finally:
+        _release_pool(pool, timed_out)
+
+
+def shutdown_parser():
+    """Stops the parser processes. Call on shutdown."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+        retired = list(_retired)
+        _retired.clear()
+    if pool is not None:
+        pool.executor.shutdown(wait=False, cancel_futures=True)
+    for pool in retired:
+        pool.terminate()
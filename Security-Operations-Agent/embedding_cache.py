@@ -0,0 +1,119 @@
+"""
+On-disk embedding cache: (model, SHA-256 of the text) -> vector, in SQLite.
+
+Report boilerplate (TLP headers, vendor disclaimers, ATT&CK descriptions) and
+repeated search queries embed to the same vectors every time, so they are
+looked up here before anything is sent to the embedding server. The cache
+holds at most max_entries vectors; the least recently used are evicted.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used);
+"""
+
+
+class EmbeddingCache:
+    """
+    Thread-safe; embedding batches look it up from worker threads.
+
+    args:
+        path (str): SQLite file
+        model (str): Embedding model name, part of every key
+        max_entries (int): Vectors kept before the least recently used are evicted
+    """
+
+    def __init__(self, path: str, model: str, max_entries: int):
+        self.model = model
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._entries = self._conn.execute("SELECT count(*) FROM embeddings").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\0{text}".encode()).hexdigest()
+
+    def embed(self, texts: list[str], embed_fn) -> list:
+        """
+        Returns a vector per text, calling embed_fn(list[str]) once for the
+        distinct texts that are not cached and storing what it returns.
+        """
+        keys = [self._key(text) for text in texts]
+        now = time.time()
+        with self._lock:
+            found = {}
+            for first in range(0, len(keys), 500):  # stay under SQLite's variable limit
+                part = list(set(keys[first:first + 500]))
+                placeholders = ",".join("?" * len(part))
+                found.update(self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", part
+                ).fetchall())
+                self._conn.execute(
+                    f"UPDATE embeddings SET last_used = ? WHERE key IN ({placeholders})", [now, *part]
+                )
+            self._conn.commit()
+
+            missed = sum(1 for key in keys if key not in found)
+            self.hits += len(keys) - missed
+            self.misses += missed
+
+        vectors = {key: np.frombuffer(blob, dtype=np.float32) for key, blob in found.items()}
+        missing = {key: text for key, text in zip(keys, texts) if key not in vectors}
+
+        if missing:
+            computed = embed_fn(list(missing.values()))
+            rows = []
+            for key, vector in zip(missing, computed):
+                vector = np.asarray(vector, dtype=np.float32)
+                vectors[key] = vector
+                rows.append((key, self.model, vector.tobytes(), now))
+            with self._lock:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, model, vector, last_used) VALUES (?, ?, ?, ?)", rows
+                )
+                self._entries += len(rows)
+                if self._entries > self.max_entries:
+                    self._evict()
+                self._conn.commit()
+        return [vectors[key] for key in keys]
+
+    def _evict(self):
+        # Down to 90% so eviction is not paid on every insert
+        excess = self._entries - int(self.max_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (excess,)
+        )
+        self._entries = self._conn.execute("SELECT count(*) FROM embeddings").fetchone()[0]
+        self.evictions += excess
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._entries,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,109 @@
+"""
+Embedding pipeline in front of the Ollama embedding server.
+
+embed_documents splits documents into batches of EMBED_BATCH_SIZE and sends
+them from worker threads, at most EMBED_CONCURRENCY requests at a time for
+the whole process, so concurrent ingestions share the server instead of
+swamping it. Failed batches are retried with exponential backoff. Vectors
+already in the embedding cache are not requested again.
+"""
+
+import asyncio
+import os
+import time
+
+from chromadb.utils.embedding_functions.ollama_embedding_function import (
+    OllamaEmbeddingFunction,
+)
+
+from embedding_cache import EmbeddingCache
+
+OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434")
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "mxbai-embed-large:latest")
+# Documents per request to the embedding server
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "32"))
+# Requests in flight to the embedding server per process
+EMBED_CONCURRENCY = int(os.environ.get("EMBED_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = int(os.environ.get("EMBED_MAX_RETRIES", "3"))
+# Delay before the first retry in seconds; doubled for every further retry
+EMBED_RETRY_BACKOFF = float(os.environ.get("EMBED_RETRY_BACKOFF", "0.5"))
+# SQLite file of the embedding cache; empty disables the cache
+EMBED_CACHE_PATH = os.environ.get("EMBED_CACHE_PATH", "embedding_cache.db")
+# Vectors kept in the cache (about 4 KB each for mxbai-embed-large)
+EMBED_CACHE_MAX_ENTRIES = int(os.environ.get("EMBED_CACHE_MAX_ENTRIES", "200000"))
+
+emb_fn = OllamaEmbeddingFunction(url=OLLAMA_URL, model_name=EMBEDDING_MODEL)
+_cache = EmbeddingCache(EMBED_CACHE_PATH, EMBEDDING_MODEL, EMBED_CACHE_MAX_ENTRIES) if EMBED_CACHE_PATH else None
+
+_semaphore = asyncio.Semaphore(max(EMBED_CONCURRENCY, 1))
+_metrics = {
+    "chunks": 0,
+    "batches": 0,
+    "retries": 0,
+    "failures": 0,
+    "seconds": 0.0,
+}
+
+
+def embed_texts(texts: list[str]) -> list:
+    """Blocking embedding of texts through the cache; one request for the cache misses."""
+    if _cache is None:
+        return emb_fn(texts)
+    return _cache.embed(texts, emb_fn)
+
+
+def embed_query(query: str):
+    """Vector for a search query, for collection.query(query_embeddings=...)."""
+    return embed_texts([query])[0]
+
+
+async def _embed_batch(batch: list[str]):
+    for attempt in range(EMBED_MAX_RETRIES + 1):
+        async with _semaphore:
+            try:
+                embeddings = await asyncio.to_thread(embed_texts, batch)
+                _metrics["batches"] += 1
+                return embeddings
+            except Exception as e:
+                if attempt == EMBED_MAX_RETRIES:
+                    _metrics["failures"] += 1
+                    raise
+                delay = EMBED_RETRY_BACKOFF * 2 ** attempt
+                print(f"Embedding batch of {len(batch)} failed ({e}); retrying in {delay:.1f}s")
+                _metrics["retries"] += 1
+        # Back off outside the semaphore so other batches keep going
+        await asyncio.sleep(delay)
+
+
+async def embed_documents(documents: list[str]) -> list:
+    """
+    Embeds documents in batches and returns their vectors in the same order.
+    Raises the embedding server's error once a batch is out of retries.
+
+    args:
+        documents (list[str]): Texts to embed
+    """
+    if not documents:
+        return []
+    started = time.perf_counter()
+    size = max(EMBED_BATCH_SIZE, 1)
+    batches = [documents[i:i + size] for i in range(0, len(documents), size)]
+    results = await asyncio.gather(*(_embed_batch(batch) for batch in batches))
+    elapsed = time.perf_counter() - started
+    _metrics["chunks"] += len(documents)
+    _metrics["seconds"] += elapsed
+    print(f"--> Embedded {len(documents)} chunks in {len(batches)} batches in {elapsed:.2f}s "
+          f"({len(documents) / elapsed if elapsed else 0:.1f} chunks/s)")
+    return [vector for result in results for vector in result]
+
+
+def embedding_stats() -> dict:
+    """Counters for /api/metrics; chunks_per_second is averaged over all embed_documents calls."""
+    seconds = _metrics["seconds"]
+    return {
+        **_metrics,
+        "chunks_per_second": round(_metrics["chunks"] / seconds, 1) if seconds else 0.0,
+        "batch_size": EMBED_BATCH_SIZE,
+        "concurrency": EMBED_CONCURRENCY,
+        "cache": _cache.stats() if _cache is not None else None,
+    }
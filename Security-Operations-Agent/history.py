@@ -0,0 +1,169 @@
+"""
+Token-budgeted conversation history for the ReAct loop.
+
+Tool results (Wazuh event dumps, raw report content) are appended to the
+conversation on every turn, so without a limit the prompt grows with each
+call. fit_history returns the messages to send for a turn within
+HISTORY_TOKEN_BUDGET tokens. A conversation that fits is sent as it is;
+otherwise, until it fits:
+
+1. Older tool results are cut down to OLD_TOOL_RESULT_TOKENS, oldest first.
+2. The newest tool result is capped at TOOL_RESULT_MAX_TOKENS.
+3. The oldest messages are folded into a rolling summary at the start.
+
+The newest message and the one before it are always kept. Tokens are counted
+with litellm's tokenizer for LMAAS_MODEL.
+"""
+
+import hashlib
+import os
+from collections import OrderedDict
+
+LMAAS_MODEL = os.environ.get("LMAAS_MODEL", "")
+# Tokens of conversation sent per model call, not counting the agent's instructions
+HISTORY_TOKEN_BUDGET = int(os.environ.get("HISTORY_TOKEN_BUDGET", "12000"))
+TOOL_RESULT_MAX_TOKENS = int(os.environ.get("TOOL_RESULT_MAX_TOKENS", "4000"))
+OLD_TOOL_RESULT_TOKENS = int(os.environ.get("OLD_TOOL_RESULT_TOKENS", "300"))
+HISTORY_SUMMARY_TOKENS = int(os.environ.get("HISTORY_SUMMARY_TOKENS", "800"))
+# Tokens of each folded message quoted in the summary
+SUMMARY_LINE_TOKENS = 60
+# Token counts remembered, by digest of the text so tool results are not kept alive
+TOKEN_CACHE_ENTRIES = 4096
+
+TOOL_RESULT_PREFIXES = ("Tool Result [", "Tool Call Error:")
+SUMMARY_HEADER = "Summary of the earlier conversation (older messages shortened):"
+
+_tokenizer_failed = False
+_token_counts = OrderedDict()  # digest -> tokens
+_truncated = OrderedDict()  # digests of tool results already counted as truncated
+_metrics = {
+    "prompts": 0,
+    "last_prompt_tokens": 0,
+    "max_prompt_tokens": 0,
+    "total_prompt_tokens": 0,
+    "truncated_tool_results": 0,
+    "summarized_messages": 0,
+}
+
+
+def _digest(text: str) -> bytes:
+    return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+
+def _remember(cache: OrderedDict, key: bytes, value=None):
+    cache[key] = value
+    cache.move_to_end(key)
+    if len(cache) > TOKEN_CACHE_ENTRIES:
+        cache.popitem(last=False)
+
+
+def count_tokens(text: str) -> int:
+    """Tokens in text for LMAAS_MODEL; about 4 characters per token if no tokenizer is available."""
+    global _tokenizer_failed
+    key = _digest(text)
+    if key in _token_counts:
+        _token_counts.move_to_end(key)
+        return _token_counts[key]
+    tokens = None
+    if not _tokenizer_failed:
+        try:
+            import litellm
+
+            tokens = litellm.token_counter(model=LMAAS_MODEL, text=text)
+        except Exception as e:
+            _tokenizer_failed = True
+            print(f"No tokenizer for {LMAAS_MODEL!r}, estimating prompt tokens from length: {e}")
+    if tokens is None:
+        tokens = len(text) // 4 + 1
+    _remember(_token_counts, key, tokens)
+    return tokens
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Keeps the start of text within max_tokens and notes how much was cut."""
+    tokens = count_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    # Characters per token of this text, to cut close to the limit in one go
+    keep = int(len(text) * max_tokens / tokens)
+    return f"{text[:keep]}\n... [truncated {tokens - max_tokens} of {tokens} tokens]"
+
+
+def _is_tool_result(message: dict) -> bool:
+    return message["role"] == "user" and message["content"].startswith(TOOL_RESULT_PREFIXES)
+
+
+def fit_history(conversation_chain: list[dict], budget: int = HISTORY_TOKEN_BUDGET) -> list[dict]:
+    """
+    Returns a copy of conversation_chain ({"role", "content"} dicts) that
+    fits in budget tokens. conversation_chain itself is not changed, so every
+    turn is cut from the full history.
+
+    args:
+        conversation_chain (list[dict]): Messages in chronological order
+        budget (int): Token budget for all messages together
+    """
+    messages = [dict(message) for message in conversation_chain if isinstance(message.get("content"), str)]
+    total = sum(count_tokens(m["content"]) for m in messages)
+    if total <= budget:
+        return messages
+
+    tool_results = [i for i, m in enumerate(messages) if _is_tool_result(m)]
+    # Oldest first; the newest result is what the model is working on, so it is cut last and least
+    limits = [(i, OLD_TOOL_RESULT_TOKENS) for i in tool_results[:-1]]
+    limits += [(i, TOOL_RESULT_MAX_TOKENS) for i in tool_results[-1:]]
+    for i, limit in limits:
+        if total <= budget:
+            break
+        original = messages[i]["content"]
+        shortened = truncate_to_tokens(original, limit)
+        if shortened is not original:
+            messages[i]["content"] = shortened
+            total += count_tokens(shortened) - count_tokens(original)
+            # The same result is cut again on every later turn; count it once
+            key = _digest(original)
+            if key not in _truncated:
+                _metrics["truncated_tool_results"] += 1
+            _remember(_truncated, key)
+
+    folded = []
+    # Fold from the front, always keeping the last two messages
+    while total > budget and len(messages) > 2:
+        message = messages.pop(0)
+        total -= count_tokens(message["content"])
+        folded.append(message)
+    if not folded:
+        return messages
+
+    _metrics["summarized_messages"] += len(folded)
+    lines = [
+        f"- {message['role']}: {truncate_to_tokens(' '.join(message['content'].split()), SUMMARY_LINE_TOKENS)}"
+        for message in folded
+    ]
+    summary = truncate_to_tokens("\n".join([SUMMARY_HEADER, *lines]), HISTORY_SUMMARY_TOKENS)
+    # Keep user/assistant alternation: merge into a leading user message
+    if messages[0]["role"] == "user":
+        messages[0]["content"] = f"{summary}\n\n{messages[0]['content']}"
+    else:
+        messages.insert(0, {"role": "user", "content": summary})
+    return messages
+
+
+def record_prompt(messages: list[dict], instructions: str = "") -> int:
+    """Counts the prompt of one model call for history_stats and returns its size in tokens."""
+    tokens = count_tokens(instructions) + sum(count_tokens(m["content"]) for m in messages)
+    _metrics["prompts"] += 1
+    _metrics["last_prompt_tokens"] = tokens
+    _metrics["max_prompt_tokens"] = max(_metrics["max_prompt_tokens"], tokens)
+    _metrics["total_prompt_tokens"] += tokens
+    return tokens
+
+
+def history_stats() -> dict:
+    """Counters for /api/metrics."""
+    prompts = _metrics["prompts"]
+    return {
+        **_metrics,
+        "avg_prompt_tokens": round(_metrics["total_prompt_tokens"] / prompts) if prompts else 0,
+        "budget": HISTORY_TOKEN_BUDGET,
+    }
@@ -0,0 +1,292 @@
+"""
+Durable ingestion job queue backed by the ingestion_jobs table.
+
+/api/upload only saves the file and enqueues a job; a bounded pool of
+asyncio workers claims jobs with FOR UPDATE SKIP LOCKED (safe with several
+server processes), uploads to S3, runs ingest_txt and records the stage the
+job is in. Failed jobs are retried with exponential backoff. A running job
+holds a lease, so a job whose process died is picked up again once the lease
+expires.
+"""
+
+import asyncio
+import os
+import shutil
+import time
+from datetime import datetime, timedelta, timezone
+
+from psycopg.rows import dict_row
+
+from database import get_async_connection
+from utils import upload_file_to_s3_async
+
+# Concurrent jobs per server process
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", "2"))
+# Unfinished jobs (queued + running, all processes) before uploads are refused
+INGEST_QUEUE_MAX = int(os.environ.get("INGEST_QUEUE_MAX", "100"))
+INGEST_MAX_ATTEMPTS = int(os.environ.get("INGEST_MAX_ATTEMPTS", "3"))
+# Delay before the first retry in seconds; doubled for every further attempt
+INGEST_RETRY_BACKOFF = float(os.environ.get("INGEST_RETRY_BACKOFF", "10"))
+# Seconds a single attempt may run before it is cancelled and retried
+INGEST_JOB_TIMEOUT = float(os.environ.get("INGEST_JOB_TIMEOUT", "1800"))
+# How often idle workers look for jobs enqueued by other processes or due retries
+INGEST_POLL_INTERVAL = float(os.environ.get("INGEST_POLL_INTERVAL", "2"))
+
+# Uploads are saved as UPLOAD_DIR/<random id>/<file name>, one directory per upload
+UPLOAD_DIR = "temp_uploads"
+
+JOB_FIELDS = (
+    "job_id, filename, status, stage, attempts, max_attempts, error, report_id, "
+    "created_at, updated_at, finished_at"
+)
+
+
+class QueueFull(Exception):
+    """Raised by enqueue when INGEST_QUEUE_MAX unfinished jobs already exist."""
+
+
+_workers: list[asyncio.Task] = []
+_wakeup = asyncio.Event()
+_metrics = {
+    "enqueued": 0,
+    "rejected": 0,
+    "succeeded": 0,
+    "failed": 0,
+    "retried": 0,
+    "running": 0,
+    "job_seconds": 0.0,
+}
+
+
+async def enqueue(
+    filename: str, file_path: str, content_hash: str | None, s3_url: str | None = None
+) -> tuple[int, bool]:
+    """
+    Records a job for a saved upload; pass s3_url if the file is already in
+    S3 so the worker skips that step. Returns (job_id, created); an unfinished
+    job for the same file or content is returned instead of a new one.
+    Raises QueueFull when the queue is at INGEST_QUEUE_MAX.
+    """
+    async with get_async_connection() as conn:
+        # Two passes at most: the conflicting job may finish between the INSERT and the SELECT
+        for _ in range(2):
+            cur = await conn.execute(
+                "SELECT job_id FROM ingestion_jobs WHERE status IN ('queued', 'running') "
+                "AND (filename = %s OR content_hash = %s) LIMIT 1",
+                (filename, content_hash),
+            )
+            existing = await cur.fetchone()
+            if existing:
+                return existing[0], False
+
+            cur = await conn.execute(
+                "SELECT count(*) FROM ingestion_jobs WHERE status IN ('queued', 'running')"
+            )
+            if (await cur.fetchone())[0] >= INGEST_QUEUE_MAX:
+                _metrics["rejected"] += 1
+                raise QueueFull(f"{INGEST_QUEUE_MAX} ingestion jobs are already pending")
+
+            # The partial unique indexes on pending jobs settle concurrent uploads of the same file
+            cur = await conn.execute(
+                "INSERT INTO ingestion_jobs (filename, file_path, content_hash, s3_url, max_attempts, stage) "
+                "VALUES (%s, %s, %s, %s, %s, 'queued') ON CONFLICT DO NOTHING RETURNING job_id",
+                (filename, file_path, content_hash, s3_url, INGEST_MAX_ATTEMPTS),
+            )
+            row = await cur.fetchone()
+            if row:
+                job_id = row[0]
+                break
+        else:
+            raise RuntimeError(f"Could not enqueue {filename}: conflicting job kept changing")
+
+    _metrics["enqueued"] += 1
+    _wakeup.set()
+    return job_id, True
+
+
+async def get_job(job_id: int) -> dict | None:
+    async with get_async_connection() as conn:
+        cur = conn.cursor(row_factory=dict_row)
+        await cur.execute(f"SELECT {JOB_FIELDS} FROM ingestion_jobs WHERE job_id = %s", (job_id,))
+        return await cur.fetchone()
+
+
+async def _update(job_id: int, **fields):
+    assignments = ", ".join(f"{name} = %s" for name in fields)
+    async with get_async_connection() as conn:
+        await conn.execute(
+            f"UPDATE ingestion_jobs SET {assignments}, updated_at = now() WHERE job_id = %s",
+            (*fields.values(), job_id),
+        )
+
+
+async def _claim() -> dict | None:
+    """Takes the oldest due job, or a running job whose lease expired."""
+    async with get_async_connection() as conn:
+        cur = conn.cursor(row_factory=dict_row)
+        await cur.execute(
+            """
+            UPDATE ingestion_jobs
+            SET status = 'running', stage = 'starting', attempts = attempts + 1, error = NULL,
+                lease_expires = now() + make_interval(secs => %s), updated_at = now()
+            WHERE job_id = (
+                SELECT job_id FROM ingestion_jobs
+                WHERE (status = 'queued' AND run_after <= now())
+                   OR (status = 'running' AND lease_expires < now())
+                ORDER BY run_after, job_id
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+            )
+            RETURNING job_id, filename, file_path, content_hash, s3_url, attempts, max_attempts
+            """,
+            (INGEST_JOB_TIMEOUT + 60,),
+        )
+        return await cur.fetchone()
+
+
+def _in_seconds(delay: float) -> datetime:
+    return datetime.now(timezone.utc) + timedelta(seconds=delay)
+
+
+def _remove_upload(file_path: str):
+    """
+    Deletes a finished job's per-upload directory. The path comes from the
+    jobs table, so it is only trusted if it has the UPLOAD_DIR/<id>/<name> shape.
+    """
+    upload_dir, name = os.path.split(os.path.normpath(file_path))
+    if os.path.dirname(upload_dir) != os.path.normpath(UPLOAD_DIR) or name in ("", ".", ".."):
+        print(f"Not removing {file_path}: not in a per-upload directory under {UPLOAD_DIR}")
+        return
+    shutil.rmtree(upload_dir, ignore_errors=True)
+
+
+async def _finish_failed(job: dict, error: str) -> bool:
+    """Schedules a retry, or marks the job failed; returns True if it will not run again."""
+    if job["attempts"] < job["max_attempts"]:
+        delay = INGEST_RETRY_BACKOFF * 2 ** (job["attempts"] - 1)
+        _metrics["retried"] += 1
+        print(f"Ingestion job {job['job_id']} attempt {job['attempts']} failed ({error}); retrying in {delay:.0f}s")
+        await _update(
+            job["job_id"], status="queued", stage="retry scheduled", error=error,
+            lease_expires=None, run_after=_in_seconds(delay),
+        )
+        return False
+    else:
+        _metrics["failed"] += 1
+        print(f"Ingestion job {job['job_id']} failed after {job['attempts']} attempts: {error}")
+        await _update(
+            job["job_id"], status="failed", stage="failed", error=error,
+            lease_expires=None, finished_at=_in_seconds(0),
+        )
+        return True
+
+
+async def _process(job: dict) -> dict:
+    from vectorstore import ingest_txt
+
+    job_id = job["job_id"]
+
+    async def on_progress(stage: str):
+        await _update(job_id, stage=stage)
+
+    s3_url = job["s3_url"]
+    if not s3_url:
+        await on_progress("uploading")
+        s3_url = await upload_file_to_s3_async(job["file_path"], os.environ.get("S3_BUCKET_NAME"))
+        await _update(job_id, s3_url=s3_url)
+
+    result = await ingest_txt(
+        job["file_path"], s3_url=s3_url, content_hash=job["content_hash"], on_progress=on_progress
+    )
+    if result is None:
+        return {"success": False, "message": "No text could be extracted from the file"}
+    return result
+
+
+async def _run(job: dict):
+    job_id = job["job_id"]
+    if job["attempts"] > job["max_attempts"]:
+        # Lease expired on the last attempt: its process died mid-job
+        await _update(job_id, status="failed", stage="failed", error="Worker lost during final attempt",
+                      lease_expires=None, finished_at=_in_seconds(0))
+        _metrics["failed"] += 1
+        _remove_upload(job["file_path"])
+        return
+
+    print(f"Ingestion job {job_id} started: {job['filename']} (attempt {job['attempts']})")
+    started = time.monotonic()
+    _metrics["running"] += 1
+    finished = False
+    try:
+        result = await asyncio.wait_for(_process(job), INGEST_JOB_TIMEOUT)
+        if result.get("success"):
+            await _update(
+                job_id, status="succeeded", stage=result["message"], report_id=result.get("report_id"),
+                lease_expires=None, finished_at=_in_seconds(0),
+            )
+            _metrics["succeeded"] += 1
+            finished = True
+            print(f"Ingestion job {job_id} finished: {result['message']}")
+        else:
+            finished = await _finish_failed(job, result.get("error") or result["message"])
+    except asyncio.CancelledError:
+        # Shutdown: hand the job back without spending an attempt
+        await asyncio.shield(_update(job_id, status="queued", stage="queued",
+                                     attempts=job["attempts"] - 1, lease_expires=None))
+        raise
+    except asyncio.TimeoutError:
+        finished = await _finish_failed(job, f"Timed out after {INGEST_JOB_TIMEOUT:.0f}s")
+    except Exception as e:
+        finished = await _finish_failed(job, str(e))
+    finally:
+        _metrics["running"] -= 1
+        _metrics["job_seconds"] += time.monotonic() - started
+    # The upload is only needed while the job may still run
+    if finished:
+        _remove_upload(job["file_path"])
+
+
+async def _worker(worker_id: int):
+    while True:
+        try:
+            job = await _claim()
+        except Exception as e:
+            print(f"Ingestion worker {worker_id} could not claim a job: {e}")
+            job = None
+        if job is None:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), INGEST_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            _wakeup.clear()
+            continue
+        await _run(job)
+
+
+def start_workers():
+    """Starts INGEST_WORKERS workers on the running event loop. Call on startup."""
+    if _workers:
+        return
+    for worker_id in range(INGEST_WORKERS):
+        _workers.append(asyncio.create_task(_worker(worker_id), name=f"ingestion-worker-{worker_id}"))
+    print(f"Started {INGEST_WORKERS} ingestion workers")
+
+
+async def stop_workers():
+    """Cancels the workers; jobs they were running go back to the queue."""
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+
+
+async def queue_stats() -> dict:
+    """Jobs per status (all processes) plus this process's worker counters."""
+    stats = {"workers": len(_workers), "max_pending": INGEST_QUEUE_MAX, **_metrics}
+    try:
+        async with get_async_connection() as conn:
+            cur = await conn.execute("SELECT status, count(*) FROM ingestion_jobs GROUP BY status")
+            stats["jobs"] = dict(await cur.fetchall())
+    except Exception as e:
+        stats["jobs"] = {"error": str(e)}
+    return stats
@@ -3,8 +3,8 @@ from agents.extensions.models.litellm_model import LitellmModel
 from openai import AsyncOpenAI
 from agents.models.openai_chatcompletions import OpenAIChatCompletionsModel
 import os
-from prompt import career_assistant_prompt, extraction_agent_prompt, wazuh_agent_prompt
-from tools import search_indicators_by_report, search_by_victim, get_file_content, get_reportsID_by_technique, get_reports_by_reportID, analyse_wazuh_data
+from prompt import career_assistant_prompt, extraction_agent_prompt, wazuh_agent_prompt, parallel_tool_calls_prompt, native_tool_calls_prompt
+from tools import report_tools, wazuh_tools
 from typing import List, Optional
 from pydantic import BaseModel, Field
 
@@ -31,6 +31,18 @@ class ReportExtraction(BaseModel):
 def log_analyses_handoff(context):
     yield "```Delegating Extraction to Extraction Agent```\n"
 
+# Opt-in: let the assistant batch independent tool calls, which the server runs concurrently
+PARALLEL_TOOL_CALLS = os.environ.get("PARALLEL_TOOL_CALLS", "").lower() in ("1", "true", "yes")
+# Opt-in, for LMAAS models with function calling: the SDK runs tool calls inside the model run.
+# Off, tools are called with JSON arrays in the reply (which are also honoured when on).
+NATIVE_TOOL_CALLING = os.environ.get("NATIVE_TOOL_CALLING", "").lower() in ("1", "true", "yes")
+
+career_assistant_instructions = career_assistant_prompt
+if PARALLEL_TOOL_CALLS:
+    career_assistant_instructions += parallel_tool_calls_prompt
+if NATIVE_TOOL_CALLING:
+    career_assistant_instructions += native_tool_calls_prompt
+
 custom_client = AsyncOpenAI(
     base_url=os.environ.get("LMAAS_URL"),
     api_key=os.environ.get("LMAAS_KEY"),
@@ -53,14 +65,12 @@ wazuh_agent = Agent(
     name= "wazuh_agent",
     instructions= wazuh_agent_prompt,
     model= custom_model,
-    tools = [
-        analyse_wazuh_data
-    ],
+    tools = wazuh_tools.function_tools,
 )
 
 career_assistant = Agent(
     name= "Gaurav",
-    instructions= career_assistant_prompt,
+    instructions= career_assistant_instructions,
     handoffs=[
         handoff(
             agent=extraction_assistant,
@@ -70,11 +80,7 @@ career_assistant = Agent(
     ],
     model = custom_model,
     tools = [
-        search_indicators_by_report, 
-        search_by_victim, 
-        get_file_content, 
-        get_reportsID_by_technique, 
-        get_reports_by_reportID,
+        *report_tools.function_tools,
         wazuh_agent.as_tool(
             tool_name="wazuh_agent",
             tool_description="Handles all the tasks related to Wazuh. Performs Wazuh analysis, provides recommendations, and performs Wazuh operations"
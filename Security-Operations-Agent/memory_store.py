@@ -1,111 +1,242 @@
 """
 File-based store compatible with the ChatKit Store interface.
-Persists chat history to a JSON file and ensures valid message IDs.
+Persists chat history through an append-only journal (see chat_journal.py)
+and ensures valid message IDs.
 """
 
 from __future__ import annotations
 
-import json
-import os
+import asyncio
 import uuid
+from bisect import bisect_right
 from collections import defaultdict
 
 from chatkit.store import NotFoundError, Store
 from chatkit.types import Attachment, Page, ThreadItem, ThreadMetadata
 from pydantic import TypeAdapter
 
+from chat_journal import ChatJournal
+
 # Adapters for serialization
 thread_adapter = TypeAdapter(ThreadMetadata)
 item_adapter = TypeAdapter(ThreadItem)
+attachment_adapter = TypeAdapter(Attachment)
+
+
+def ensure_valid_id(item: ThreadItem, context: dict = None):
+    """
+    Helper to fix invalid IDs.
+    Checks context for a forced ID from the server, otherwise generates random.
+    """
+    if not item.id or item.id == "__fake_id__":
+        if context and "forced_item_id" in context:
+            item.id = context["forced_item_id"]
+        else:
+            item.id = f"msg_{uuid.uuid4().hex[:8]}"
+
+
+class ThreadItems:
+    """
+    Items of a single thread, kept sorted by created_at (ties in insertion
+    order) with an item_id -> position index. Lookup and in-place replacement
+    are O(1), appends of new items are O(1) in the common in-order case, and
+    pagination slices the list directly instead of sorting it.
+    """
+
+    __slots__ = ("_rows", "_pos")
+
+    def __init__(self, items=()):
+        self._rows: list[ThreadItem] = []
+        self._pos: dict[str, int] = {}
+        for item in items:
+            self.upsert(item)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def get(self, item_id: str) -> ThreadItem | None:
+        idx = self._pos.get(item_id)
+        return None if idx is None else self._rows[idx]
+
+    def upsert(self, item: ThreadItem) -> None:
+        idx = self._pos.get(item.id)
+        if idx is not None:
+            if self._rows[idx].created_at == item.created_at:
+                self._rows[idx] = item
+                return
+            self.remove(item.id)
+
+        rows = self._rows
+        if not rows or rows[-1].created_at <= item.created_at:
+            self._pos[item.id] = len(rows)
+            rows.append(item)
+            return
+
+        idx = bisect_right(rows, item.created_at, key=lambda i: i.created_at)
+        rows.insert(idx, item)
+        self._reindex(idx)
+
+    def remove(self, item_id: str) -> None:
+        idx = self._pos.pop(item_id, None)
+        if idx is None:
+            return
+        del self._rows[idx]
+        self._reindex(idx)
+
+    def page(self, after: str | None, limit: int, order: str) -> Page[ThreadItem]:
+        rows = self._rows
+        n = len(rows)
+        anchor = self._pos.get(after) if after else None
+        if order == "desc":
+            # Position k in descending order is rows[n - 1 - k].
+            start = n - anchor if anchor is not None else 0
+            data = [rows[n - 1 - k] for k in range(start, min(start + limit, n))]
+        else:
+            start = anchor + 1 if anchor is not None else 0
+            data = rows[start : start + limit]
+        has_more = start + limit < n
+        next_after = data[-1].id if has_more and data else None
+        return Page(data=data, has_more=has_more, after=next_after)
+
+    def _reindex(self, start: int) -> None:
+        for idx in range(start, len(self._rows)):
+            self._pos[self._rows[idx].id] = idx
 
-DB_FILE = "chat_history.json"
 
 class MemoryStore(Store[dict]):
-    def __init__(self):
+    def __init__(self, journal: ChatJournal | None = None):
         self.threads: dict[str, ThreadMetadata] = {}
-        self.items: dict[str, list[ThreadItem]] = defaultdict(list)
+        self.items: dict[str, ThreadItems] = defaultdict(ThreadItems)
         self.attachments: dict[str, Attachment] = {}
+        self._journal = journal or ChatJournal()
         self._load_db()
 
     def _load_db(self):
-        """Loads data from the JSON file."""
-        if not os.path.exists(DB_FILE):
-            return
-
+        """
+        Loads data from the snapshot plus journal, replacing the in-memory state.
+        Only called at startup and when the files were changed by another process;
+        the in-memory dicts are authoritative otherwise.
+        """
         try:
-            with open(DB_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-
-            for tid, t_data in data.get("threads", {}).items():
-                self.threads[tid] = thread_adapter.validate_python(t_data)
-
-            for tid, i_list in data.get("items", {}).items():
-                self.items[tid] = [item_adapter.validate_python(i) for i in i_list]
-
-            for att_id, att_data in data.get("attachments", {}).items():
-                 # Assuming Attachment can be validated similarly or is a dict
-                 if isinstance(att_data, dict):
-                     # att_data.name is '5.txt', '4.txt', '2.txt'
-                    pass
-                 pass 
-            
-            # Better approach for attachments if type adapter is tricky without discriminator
-            # But Attachment IS a Union in chatkit.types. Using TypeAdapter(Attachment)
-            att_adapter = TypeAdapter(Attachment)
-            for att_id, att_data in data.get("attachments", {}).items():
-                self.attachments[att_id] = att_adapter.validate_python(att_data)
+            image = self._journal.load()
+
+            threads = {
+                tid: thread_adapter.validate_python(t_data)
+                for tid, t_data in image["threads"].items()
+            }
+            items = defaultdict(ThreadItems)
+            for tid, i_map in image["items"].items():
+                items[tid] = ThreadItems(item_adapter.validate_python(i) for i in i_map.values())
+            attachments = {
+                att_id: attachment_adapter.validate_python(att_data)
+                for att_id, att_data in image["attachments"].items()
+            }
         except Exception as e:
             print(f"Warning: Could not load chat history: {e}")
+            return
+
+        self.threads, self.items, self.attachments = threads, items, attachments
 
-    def _save_db(self):
-        """Saves memory state to JSON file."""
+    def reload(self):
+        """Forces a reload from disk, e.g. after editing chat history by hand."""
+        self._load_db()
+
+    async def _reload_if_changed(self):
+        if not self._journal.shared:
+            if self._journal.changed_on_disk():
+                self._load_db()
+            return
+
+        if not self._journal.has_foreign_changes():
+            return
+        records = await asyncio.to_thread(self._journal.poll)
+        if records is None:
+            self._load_db()
+            return
+        for record in records:
+            self._replay(record)
+
+    def _replay(self, record: dict):
+        """Applies a journal record written by another process to the in-memory state."""
+        op = record["op"]
+        if op == "thread":
+            thread = thread_adapter.validate_python(record["data"])
+            self.threads[thread.id] = thread
+        elif op == "delete_thread":
+            self.threads.pop(record["id"], None)
+            self.items.pop(record["id"], None)
+        elif op == "item":
+            self.items[record["thread_id"]].upsert(item_adapter.validate_python(record["data"]))
+        elif op == "delete_item":
+            items = self.items.get(record["thread_id"])
+            if items is not None:
+                items.remove(record["id"])
+        elif op == "attachment":
+            attachment = attachment_adapter.validate_python(record["data"])
+            self.attachments[attachment.id] = attachment
+        elif op == "delete_attachment":
+            self.attachments.pop(record["id"], None)
+
+    async def _persist(self, record: dict):
+        """
+        Single process: queues a single mutation for the journal's background
+        writer. Only the changed record is serialized here; no file I/O happens
+        on the event loop.
+
+        Multi-process: writes through under the journal's file lock (in a worker
+        thread) and applies whatever other workers appended before us, so this
+        process's view matches the order on disk.
+        """
         try:
-            raw_data = {
-                "threads": {
-                    k: thread_adapter.dump_python(v, mode='json') 
-                    for k, v in self.threads.items()
-                },
-                "items": {
-                    k: [item_adapter.dump_python(i, mode='json') for i in v] 
-                    for k, v in self.items.items()
-                },
-                "attachments": {
-                    k:  TypeAdapter(Attachment).dump_python(v, mode='json')
-                    for k, v in self.attachments.items()
-                }
-            }
-            with open(DB_FILE, "w", encoding="utf-8") as f:
-                json.dump(raw_data, f, indent=2, default=str)
+            if not self._journal.shared:
+                self._journal.submit(record)
+                return
+
+            foreign = await asyncio.to_thread(self._journal.append, [record])
+            if foreign is None:
+                self._load_db()
+            elif foreign:
+                for other in foreign:
+                    self._replay(other)
+                # Ours landed after theirs on disk, so it wins here too.
+                self._replay(record)
         except Exception as e:
             print(f"Error saving chat history: {e}")
 
-    def _ensure_valid_id(self, item: ThreadItem, context: dict = None):
-        """
-        Helper to fix invalid IDs.
-        Checks context for a forced ID from the server, otherwise generates random.
-        """
-        if not item.id or item.id == "__fake_id__":
-            if context and "forced_item_id" in context:
-                item.id = context["forced_item_id"]
-            else:
-                item.id = f"msg_{uuid.uuid4().hex[:8]}"
+    def flush(self, timeout: float | None = None) -> bool:
+        """Blocks until all queued writes are on disk. Call on shutdown."""
+        return self._journal.flush(timeout)
+
+    def close(self):
+        """Flushes pending writes and stops the background writer."""
+        self._journal.close()
+
+    async def _persist_item(self, thread_id: str, item: ThreadItem):
+        await self._persist({
+            "op": "item",
+            "thread_id": thread_id,
+            "data": item_adapter.dump_python(item, mode="json"),
+        })
 
     # --- Interface Implementation ---
 
     async def load_thread(self, thread_id: str, context: dict) -> ThreadMetadata:
-        self._load_db()
+        await self._reload_if_changed()
         if thread_id not in self.threads:
             raise NotFoundError(f"Thread {thread_id} not found")
         return self.threads[thread_id]
 
     async def save_thread(self, thread: ThreadMetadata, context: dict) -> None:
         self.threads[thread.id] = thread
-        self._save_db()
+        await self._persist({"op": "thread", "data": thread_adapter.dump_python(thread, mode="json")})
 
     async def load_threads(
         self, limit: int, after: str | None, order: str, context: dict
     ) -> Page[ThreadMetadata]:
-        self._load_db()
+        await self._reload_if_changed()
         threads = list(self.threads.values())
         return self._paginate(
             threads,
@@ -119,68 +250,50 @@ class MemoryStore(Store[dict]):
     async def load_thread_items(
         self, thread_id: str, after: str | None, limit: int, order: str, context: dict
     ) -> Page[ThreadItem]:
-        self._load_db()
-        items = self.items.get(thread_id, [])
-        return self._paginate(
-            items,
-            after,
-            limit,
-            order,
-            sort_key=lambda i: i.created_at,
-            cursor_key=lambda i: i.id,
-        )
+        await self._reload_if_changed()
+        items = self.items.get(thread_id)
+        if items is None:
+            return Page(data=[], has_more=False, after=None)
+        return items.page(after, limit, order)
 
     async def add_thread_item(
         self, thread_id: str, item: ThreadItem, context: dict
     ) -> None:
         # Pass context so we can grab the forced_id
-        self._ensure_valid_id(item, context)
+        ensure_valid_id(item, context)
         
-        self.items[thread_id].append(item)
-        self._save_db()
+        self.items[thread_id].upsert(item)
+        await self._persist_item(thread_id, item)
 
     async def save_item(self, thread_id: str, item: ThreadItem, context: dict) -> None:
         # Pass context here too
-        self._ensure_valid_id(item, context)
+        ensure_valid_id(item, context)
 
-        if thread_id not in self.items:
-            self.items[thread_id] = []
-            
-        items = self.items[thread_id]
-        found = False
-        
-        for idx, existing in enumerate(items):
-            if existing.id == item.id:
-                items[idx] = item
-                found = True
-                break
-        
-        if not found:
-            items.append(item)
-            
-        self._save_db()
+        self.items[thread_id].upsert(item)
+        await self._persist_item(thread_id, item)
 
     async def load_item(
         self, thread_id: str, item_id: str, context: dict
     ) -> ThreadItem:
-        self._load_db()
-        for item in self.items.get(thread_id, []):
-            if item.id == item_id:
-                return item
+        await self._reload_if_changed()
+        items = self.items.get(thread_id)
+        item = items.get(item_id) if items is not None else None
+        if item is not None:
+            return item
         raise NotFoundError(f"Item {item_id} not found in thread {thread_id}")
 
     async def delete_thread(self, thread_id: str, context: dict) -> None:
         self.threads.pop(thread_id, None)
         self.items.pop(thread_id, None)
-        self._save_db()
+        await self._persist({"op": "delete_thread", "id": thread_id})
 
     async def delete_thread_item(
         self, thread_id: str, item_id: str, context: dict
     ) -> None:
-        self.items[thread_id] = [
-            item for item in self.items.get(thread_id, []) if item.id != item_id
-        ]
-        self._save_db()
+        items = self.items.get(thread_id)
+        if items is not None:
+            items.remove(item_id)
+        await self._persist({"op": "delete_item", "thread_id": thread_id, "id": item_id})
 
     def _paginate(
         self,
@@ -205,10 +318,10 @@ class MemoryStore(Store[dict]):
 
     async def save_attachment(self, attachment: Attachment, context: dict) -> None:
         self.attachments[attachment.id] = attachment
-        self._save_db()
+        await self._persist({"op": "attachment", "data": attachment_adapter.dump_python(attachment, mode="json")})
     
     async def load_attachment(self, attachment_id: str, context: dict) -> Attachment:
-        self._load_db()
+        await self._reload_if_changed()
         if attachment_id not in self.attachments:
             raise NotFoundError(f"Attachment {attachment_id} not found")
         return self.attachments[attachment_id]
@@ -216,4 +329,4 @@ class MemoryStore(Store[dict]):
     async def delete_attachment(self, attachment_id: str, context: dict) -> None:
         if attachment_id in self.attachments:
             del self.attachments[attachment_id]
-            self._save_db()
\ No newline at end of file
+            await self._persist({"op": "delete_attachment", "id": attachment_id})
\ No newline at end of file
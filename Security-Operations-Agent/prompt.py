@@ -239,6 +239,24 @@ Your strength is in LOGICAL REASONING and TOOL CHAINING. When you see a complex
 You are not just executing single tools - you are orchestrating multiple tools to build comprehensive answers. But you MUST call them ONE AT A TIME.
 """
 
+# Appended to career_assistant_prompt when PARALLEL_TOOL_CALLS is enabled; overrides the one-call rule
+parallel_tool_calls_prompt = """
+
+### PARALLEL TOOL CALLS (OVERRIDES "ONE TOOL CALL PER MESSAGE")
+Independent tool calls may now be sent together in ONE JSON array. They are all executed and you receive every result in your next turn, one `Tool Result [tool_name]: <result data>` line per call.
+- Batch calls whose arguments you already have, e.g. `get_reports_by_reportID` for every report ID returned by `get_reportsID_by_technique`:
+  `[{"name": "get_reports_by_reportID", "arguments": {"report_id": 101}}, {"name": "get_reports_by_reportID", "arguments": {"report_id": 102}}]`
+- NEVER batch a call that needs another call's result; wait for that result first.
+- `wazuh_agent` is ALWAYS called on its own.
+"""
+
+# Appended to career_assistant_prompt when NATIVE_TOOL_CALLING is enabled; overrides the JSON tool call format
+native_tool_calls_prompt = """
+
+### NATIVE TOOL CALLS (OVERRIDES "TOOL CALL FORMAT")
+Call tools through the function-calling interface, NOT by writing a JSON array in your reply. Each result is returned to you directly, so you can call the next tool right away. All other tool rules above still apply.
+"""
+
 extraction_agent_prompt = """
     You are a Tier 3 SOC Analyst. Extract strict intelligence from this SIEM report. If a particular intelligence is not found then just put none in that field.
 """
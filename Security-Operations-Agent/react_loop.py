@@ -0,0 +1,181 @@
+"""
+The ReAct loop shared by the main assistant (MyAgentServer.respond) and the
+Wazuh agent (utils.handling_wazuh_agent).
+
+Every turn runs the agent, streams its reply to the client through a
+TurnStream, and dispatches tool calls through a ToolRegistry: native calls
+are executed by the SDK inside the run, calls written as a JSON array are
+parsed from the reply and their results fed back for the next turn.
+"""
+
+import asyncio
+import json
+import os
+import traceback
+
+from agents import Runner
+from chatkit.agents import stream_agent_response
+
+from history import fit_history, record_prompt
+from tool_registry import TOOL_ERROR_PREFIX, ToolRegistry, canonical_tool_name, parse_tool_calls, tool_call_pattern
+from tool_stream import TurnStream
+
+# Report tools are read-only lookups, so a batch of them can run at once
+TOOL_CALL_CONCURRENCY = int(os.environ.get("TOOL_CALL_CONCURRENCY", "4"))
+
+_tool_call_semaphore = asyncio.Semaphore(max(TOOL_CALL_CONCURRENCY, 1))
+_metrics = {
+    "turns": 0,
+    "tool_turns": 0,
+    "wasted_turns": 0,
+    "tool_calls": 0,
+    "failed_tool_calls": 0,
+    "native_tool_calls": 0,
+    "unparseable_tool_calls": 0,
+}
+
+
+def unique_tool_calls(tool_calls: list) -> list:
+    """Drops repeated calls (same tool, same arguments) from a parsed batch, keeping order."""
+    seen, calls = set(), []
+    for call in tool_calls:
+        key = json.dumps(
+            [canonical_tool_name(str(call.get("name", ""))), call.get("arguments", {})], sort_keys=True, default=str
+        )
+        if key not in seen:
+            seen.add(key)
+            calls.append(call)
+    return calls
+
+
+class ToolLoop:
+    """
+    Runs an agent until it answers without calling a tool, or for max_turns.
+    run() yields the ChatKit events to send to the client; afterwards
+    answered tells whether the model produced a final answer.
+
+    args:
+        agent (Agent): The agent to run
+        registry (ToolRegistry): Tools the agent may call with a JSON array
+        max_turns (int): Model calls before giving up
+        batch (bool): Run every distinct call of a JSON array concurrently;
+            otherwise only the first one runs and the model sees its result
+            before deciding on the next
+        streaming_tools (dict, optional): name -> callable(arguments, agent_context)
+            returning an async iterator of events. Such a tool is always called
+            on its own, its events are forwarded and its output ends the loop
+        new_item_id (callable, optional): Returns the ID for the next assistant
+            message, replacing LiteLLM's placeholder
+    """
+
+    def __init__(self, agent, registry: ToolRegistry, max_turns: int, batch: bool = False,
+                 streaming_tools: dict | None = None, new_item_id=None):
+        self.agent = agent
+        self.registry = registry
+        self.max_turns = max_turns
+        self.batch = batch
+        self.streaming_tools = streaming_tools or {}
+        self.new_item_id = new_item_id
+        self.call_names = registry.call_names + list(self.streaming_tools)
+        self.pattern = tool_call_pattern(self.call_names)
+        self.answered = False
+
+    async def run(self, conversation_chain: list, make_context):
+        """
+        args:
+            conversation_chain (list): Messages so far; tool turns are appended to it
+            make_context (callable): Returns the AgentContext for a turn
+        """
+        for turn in range(self.max_turns):
+            item_id = self.new_item_id() if self.new_item_id else None
+            agent_context = make_context()
+            # conversation_chain keeps everything; each call gets it cut to the token budget
+            prompt = fit_history(conversation_chain)
+            instructions = self.agent.instructions if isinstance(self.agent.instructions, str) else ""
+            prompt_tokens = record_prompt(prompt, instructions)
+            print(f"{self.agent.name}: turn {turn + 1} prompt is {prompt_tokens} tokens ({len(prompt)} messages)")
+            result = Runner.run_streamed(self.agent, prompt, context=agent_context)
+
+            # Text is forwarded as it streams; only what could still be a tool call is held back
+            turn_stream = TurnStream(self.call_names, item_id=item_id)
+            async for event in turn_stream.forward(stream_agent_response(agent_context, result)):
+                yield event
+            _metrics["turns"] += 1
+            _metrics["native_tool_calls"] += sum(1 for item in result.new_items if item.type == "tool_call_item")
+
+            reply = turn_stream.text
+            calls, parse_error = parse_tool_calls(reply, self.pattern)
+            if calls is None and parse_error is None and not turn_stream.tool_call_detected:
+                self.answered = True
+                return
+
+            # Text the detector let through is part of the tool call turn
+            for event in turn_stream.withdraw():
+                yield event
+            _metrics["tool_turns"] += 1
+
+            if not calls:
+                _metrics["wasted_turns"] += 1
+                _metrics["unparseable_tool_calls"] += 1
+                print(f"{self.agent.name}: unparseable tool call in turn {turn + 1}: {parse_error}")
+                if turn == self.max_turns - 1:
+                    # Show what the model wrote rather than nothing
+                    for event in turn_stream.release():
+                        yield event
+                    return
+                conversation_chain.append({"role": "assistant", "content": reply})
+                conversation_chain.append({"role": "user", "content": (
+                    f"Tool Call Error: your tool call is not valid JSON ({parse_error or 'empty call list'}). "
+                    'Reply with a valid array like [{"name": "tool_name", "arguments": {...}}], or answer without tools.'
+                )})
+                continue
+
+            calls = unique_tool_calls(calls)
+            streaming = [call for call in calls if canonical_tool_name(str(call.get("name", ""))) in self.streaming_tools]
+            if streaming:
+                call = streaming[0]
+                name = canonical_tool_name(str(call["name"]))
+                _metrics["tool_calls"] += 1
+                try:
+                    async for event in self.streaming_tools[name](call.get("arguments", {}), agent_context):
+                        yield event
+                    self.answered = True
+                    return
+                except Exception as e:
+                    print(f"Error running {name}: {e}")
+                    traceback.print_exc()
+                    _metrics["failed_tool_calls"] += 1
+                    _metrics["wasted_turns"] += 1
+                    results = [(name, f"Error during {name}: {e}")]
+            else:
+                if not self.batch:
+                    calls = calls[:1]
+                elif len(calls) > 1:
+                    print(f"{self.agent.name}: running {len(calls)} tool calls in parallel")
+                results = await asyncio.gather(*(self._call(call, agent_context) for call in calls))
+                if all(isinstance(res, str) and res.startswith(("Error", TOOL_ERROR_PREFIX)) for _, res in results):
+                    _metrics["wasted_turns"] += 1
+
+            conversation_chain.append({"role": "assistant", "content": reply})
+            conversation_chain.append({"role": "user", "content": "\n\n".join(
+                f"Tool Result [{name}]: {json.dumps([res], default=str)}" for name, res in results
+            )})
+
+    async def _call(self, call: dict, agent_context) -> tuple[str, object]:
+        name = canonical_tool_name(str(call.get("name", "")))
+        _metrics["tool_calls"] += 1
+        async with _tool_call_semaphore:
+            res = await self.registry.call(name, call.get("arguments", {}), agent_context)
+        if isinstance(res, str) and res.startswith(("Error", TOOL_ERROR_PREFIX)):
+            _metrics["failed_tool_calls"] += 1
+            print(f"{self.agent.name}: tool {name} failed: {res[:200]}")
+        return name, res
+
+
+def tool_call_stats() -> dict:
+    """Counters for /api/metrics; wasted_turn_rate is the share of tool turns that produced no usable result."""
+    tool_turns = _metrics["tool_turns"]
+    return {
+        **_metrics,
+        "wasted_turn_rate": round(_metrics["wasted_turns"] / tool_turns, 3) if tool_turns else 0.0,
+    }
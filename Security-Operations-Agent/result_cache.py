@@ -0,0 +1,191 @@
+"""
+In-memory TTL/LRU cache for the report lookup tools in tools.py.
+
+The assistant repeats the same lookups (a report by ID, its IoCs, the
+reports for a technique) within and across conversations, and each one is a
+Postgres round-trip. Results are kept for RESULT_CACHE_TTL seconds, within
+RESULT_CACHE_MAX_BYTES of (approximate) result size; the least recently used
+are evicted first.
+
+The cache holds results of one generation, a counter in the
+result_cache_generation table that ingest_txt bumps in the transaction that
+commits a new report. Every process reads it at most once per
+RESULT_CACHE_CHECK_INTERVAL seconds and drops its cache when it changed, so a
+new report is seen by all server processes within that interval.
+"""
+
+import functools
+import inspect
+import os
+import sys
+import time
+from collections import OrderedDict
+
+from database import get_async_connection
+
+RESULT_CACHE_TTL = float(os.environ.get("RESULT_CACHE_TTL", "300"))
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+# Seconds between reads of the shared generation counter
+RESULT_CACHE_CHECK_INTERVAL = float(os.environ.get("RESULT_CACHE_CHECK_INTERVAL", "1"))
+
+_entries = OrderedDict()  # key -> (expires_at, size, result); all of the current generation
+_bytes = 0
+_generation = None  # unknown until the first read
+_checked_at = 0.0
+_metrics = {
+    "hits": 0,
+    "misses": 0,
+    "expired": 0,
+    "evictions": 0,
+    "too_large": 0,
+    "invalidations": 0,
+    "generation_errors": 0,
+}
+
+
+def _approx_size(value) -> int:
+    """Rough size in bytes of a query result (strings, numbers, tuples and lists of them)."""
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(_approx_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+def _clear():
+    global _bytes
+    _entries.clear()
+    _bytes = 0
+
+
+def invalidate_results():
+    """
+    Drops this process's cached results and has the next lookup re-read the
+    generation. Called by ingest_txt after a report commits; other processes
+    notice the new generation on their own.
+    """
+    global _generation
+    _clear()
+    # Also keeps lookups that were already running from storing their results
+    _generation = None
+    _metrics["invalidations"] += 1
+
+
+async def _current_generation():
+    """The shared generation, read at most once per RESULT_CACHE_CHECK_INTERVAL; None if unavailable."""
+    global _generation, _checked_at
+    now = time.monotonic()
+    if _generation is not None and now - _checked_at < RESULT_CACHE_CHECK_INTERVAL:
+        return _generation
+    try:
+        async with get_async_connection() as conn:
+            cur = await conn.execute("SELECT generation FROM result_cache_generation")
+            row = await cur.fetchone()
+    except Exception as e:
+        # No cache rather than a cache that may be stale
+        _metrics["generation_errors"] += 1
+        print(f"Could not read the result cache generation, not caching: {e}")
+        _clear()
+        _generation = None
+        return None
+    generation = row[0] if row else 0
+    if generation != _generation:
+        _clear()
+        _generation = generation
+    _checked_at = now
+    return _generation
+
+
+def _store(key, result):
+    global _bytes
+    size = _approx_size(result)
+    if size > RESULT_CACHE_MAX_BYTES:
+        _metrics["too_large"] += 1
+        return
+    _entries[key] = (time.monotonic() + RESULT_CACHE_TTL, size, result)
+    _bytes += size
+    while _bytes > RESULT_CACHE_MAX_BYTES:
+        _, (_, evicted, _) = _entries.popitem(last=False)
+        _bytes -= evicted
+        _metrics["evictions"] += 1
+
+
+def _drop(key):
+    global _bytes
+    _, size, _ = _entries.pop(key)
+    _bytes -= size
+
+
+def cached_result(case_insensitive=()):
+    """
+    Caches the results of an async lookup, keyed by its name and its bound
+    arguments (defaults filled in, strings stripped). Exceptions are not cached.
+
+    args:
+        case_insensitive (tuple of str): Arguments the query matches without
+            regard to case (ILIKE or upper-cased), so 't1566' and 'T1566' share an entry
+    """
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        def make_key(args, kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            normalized = []
+            for name, value in bound.arguments.items():
+                if isinstance(value, str):
+                    value = value.strip()
+                    if name in case_insensitive:
+                        value = value.casefold()
+                normalized.append((name, value))
+            return (func.__qualname__, tuple(normalized))
+
+        # functools.wraps keeps the signature and docstring function_tool builds the schema from
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if RESULT_CACHE_TTL <= 0 or RESULT_CACHE_MAX_BYTES <= 0:
+                return await func(*args, **kwargs)
+            try:
+                key = make_key(args, kwargs)
+                hash(key)
+            except TypeError:
+                # Unhashable or unexpected arguments: let the function deal with them
+                return await func(*args, **kwargs)
+
+            generation = await _current_generation()
+            if generation is None:
+                return await func(*args, **kwargs)
+
+            entry = _entries.get(key)
+            if entry is not None:
+                expires_at, _, result = entry
+                if expires_at > time.monotonic():
+                    _entries.move_to_end(key)
+                    _metrics["hits"] += 1
+                    return result
+                _drop(key)
+                _metrics["expired"] += 1
+            _metrics["misses"] += 1
+
+            result = await func(*args, **kwargs)
+            # A report committed while the query ran may be missing from result
+            if generation == _generation and key not in _entries:
+                _store(key, result)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def result_cache_stats() -> dict:
+    """Counters for /api/metrics."""
+    lookups = _metrics["hits"] + _metrics["misses"]
+    return {
+        **_metrics,
+        "entries": len(_entries),
+        "bytes": _bytes,
+        "max_bytes": RESULT_CACHE_MAX_BYTES,
+        "ttl": RESULT_CACHE_TTL,
+        "generation": _generation,
+        "hit_rate": round(_metrics["hits"] / lookups, 3) if lookups else 0.0,
+    }
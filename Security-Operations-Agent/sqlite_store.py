@@ -0,0 +1,285 @@
+"""
+SQLite-backed store compatible with the ChatKit Store interface.
+Threads, items and attachments are kept as one row each, with indexes on
+(thread_id, created_at, id) so pagination is a keyset range scan instead of a
+sort of the whole thread. Every write is its own small transaction.
+
+The connection is used from one dedicated thread: every Store method hands
+its queries to it and awaits the result, so commits (and fsyncs) never block
+the event loop and calls are serialized without extra locking.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import json
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from chatkit.store import NotFoundError, Store
+from chatkit.types import Attachment, Page, ThreadItem, ThreadMetadata
+
+from chat_journal import ChatJournal
+from memory_store import attachment_adapter, ensure_valid_id, item_adapter, thread_adapter
+
+SQLITE_FILE = os.environ.get("CHAT_SQLITE_PATH", "chat_history.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS threads (
+    id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_threads_created ON threads (created_at, id);
+
+CREATE TABLE IF NOT EXISTS items (
+    thread_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (thread_id, id)
+);
+CREATE INDEX IF NOT EXISTS idx_items_thread_created ON items (thread_id, created_at, id);
+
+CREATE TABLE IF NOT EXISTS attachments (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def _dumps(adapter, value) -> str:
+    return json.dumps(adapter.dump_python(value, mode="json"), default=str)
+
+
+class SQLiteStore(Store[dict]):
+    def __init__(self, path: str = SQLITE_FILE):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat-sqlite")
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate_from_json()
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Writes are committed per row, so there is never anything to flush."""
+        return True
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._conn.close()
+
+    async def _run(self, func, *args):
+        """Runs func(*args) on the connection's thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args))
+
+    def _migrate_from_json(self, journal: ChatJournal | None = None):
+        """
+        One-shot import of an existing chat_history.json (+ journal) written by
+        MemoryStore. The source files are left untouched.
+        """
+        if self._conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+            return
+
+        journal = journal or ChatJournal()
+        try:
+            image = journal.load()
+            with self._conn:
+                for t_data in image["threads"].values():
+                    thread = thread_adapter.validate_python(t_data)
+                    self._upsert_thread(thread)
+                for tid, i_map in image["items"].items():
+                    for i_data in i_map.values():
+                        self._upsert_item(tid, item_adapter.validate_python(i_data))
+                for att_data in image["attachments"].values():
+                    self._upsert_attachment(attachment_adapter.validate_python(att_data))
+                self._conn.execute(
+                    "INSERT INTO meta (key, value) VALUES ('json_migrated', ?)",
+                    (journal.snapshot_path,),
+                )
+            print(
+                f"Migrated {len(image['threads'])} threads from "
+                f"{journal.snapshot_path} into SQLite store"
+            )
+        except Exception as e:
+            print(f"Warning: Could not migrate chat history to SQLite: {e}")
+
+    # --- Row helpers (callers own the transaction) ---
+
+    def _upsert_thread(self, thread: ThreadMetadata):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO threads (id, created_at, data) VALUES (?, ?, ?)",
+            (thread.id, thread.created_at.timestamp(), _dumps(thread_adapter, thread)),
+        )
+
+    def _upsert_item(self, thread_id: str, item: ThreadItem):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO items (thread_id, id, created_at, data) VALUES (?, ?, ?, ?)",
+            (thread_id, item.id, item.created_at.timestamp(), _dumps(item_adapter, item)),
+        )
+
+    def _upsert_attachment(self, attachment: Attachment):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO attachments (id, data) VALUES (?, ?)",
+            (attachment.id, _dumps(attachment_adapter, attachment)),
+        )
+
+    def _keyset_page(
+        self,
+        table: str,
+        where: str,
+        params: tuple,
+        cursor_row: tuple | None,
+        limit: int,
+        order: str,
+    ) -> tuple[list[tuple], bool]:
+        """
+        Returns up to ``limit`` (id, data) rows strictly after ``cursor_row``
+        (its created_at, id) in the requested order, plus a has_more flag.
+        """
+        direction, op = ("DESC", "<") if order == "desc" else ("ASC", ">")
+        if cursor_row is not None:
+            where += f" AND (created_at, id) {op} (?, ?)"
+            params += tuple(cursor_row)
+        rows = self._conn.execute(
+            f"SELECT id, data FROM {table} WHERE {where} "
+            f"ORDER BY created_at {direction}, id {direction} LIMIT ?",
+            params + (limit + 1,),
+        ).fetchall()
+        return rows[:limit], len(rows) > limit
+
+    # --- Blocking implementations (run on the connection's thread) ---
+
+    def _load_thread(self, thread_id: str) -> ThreadMetadata:
+        row = self._conn.execute("SELECT data FROM threads WHERE id = ?", (thread_id,)).fetchone()
+        if row is None:
+            raise NotFoundError(f"Thread {thread_id} not found")
+        return thread_adapter.validate_json(row[0])
+
+    def _save_thread(self, thread: ThreadMetadata):
+        with self._conn:
+            self._upsert_thread(thread)
+
+    def _load_threads(self, limit: int, after: str | None, order: str) -> Page[ThreadMetadata]:
+        cursor_row = None
+        if after:
+            cursor_row = self._conn.execute(
+                "SELECT created_at, id FROM threads WHERE id = ?", (after,)
+            ).fetchone()
+        rows, has_more = self._keyset_page("threads", "1 = 1", (), cursor_row, limit, order)
+        data = [thread_adapter.validate_json(r[1]) for r in rows]
+        next_after = rows[-1][0] if has_more and rows else None
+        return Page(data=data, has_more=has_more, after=next_after)
+
+    def _load_thread_items(
+        self, thread_id: str, after: str | None, limit: int, order: str
+    ) -> Page[ThreadItem]:
+        cursor_row = None
+        if after:
+            cursor_row = self._conn.execute(
+                "SELECT created_at, id FROM items WHERE thread_id = ? AND id = ?",
+                (thread_id, after),
+            ).fetchone()
+        rows, has_more = self._keyset_page(
+            "items", "thread_id = ?", (thread_id,), cursor_row, limit, order
+        )
+        data = [item_adapter.validate_json(r[1]) for r in rows]
+        next_after = rows[-1][0] if has_more and rows else None
+        return Page(data=data, has_more=has_more, after=next_after)
+
+    def _save_item(self, thread_id: str, item: ThreadItem):
+        with self._conn:
+            self._upsert_item(thread_id, item)
+
+    def _load_item(self, thread_id: str, item_id: str) -> ThreadItem:
+        row = self._conn.execute(
+            "SELECT data FROM items WHERE thread_id = ? AND id = ?", (thread_id, item_id)
+        ).fetchone()
+        if row is None:
+            raise NotFoundError(f"Item {item_id} not found in thread {thread_id}")
+        return item_adapter.validate_json(row[0])
+
+    def _delete_thread(self, thread_id: str):
+        with self._conn:
+            self._conn.execute("DELETE FROM items WHERE thread_id = ?", (thread_id,))
+            self._conn.execute("DELETE FROM threads WHERE id = ?", (thread_id,))
+
+    def _delete_thread_item(self, thread_id: str, item_id: str):
+        with self._conn:
+            self._conn.execute(
+                "DELETE FROM items WHERE thread_id = ? AND id = ?", (thread_id, item_id)
+            )
+
+    def _save_attachment(self, attachment: Attachment):
+        with self._conn:
+            self._upsert_attachment(attachment)
+
+    def _load_attachment(self, attachment_id: str) -> Attachment:
+        row = self._conn.execute(
+            "SELECT data FROM attachments WHERE id = ?", (attachment_id,)
+        ).fetchone()
+        if row is None:
+            raise NotFoundError(f"Attachment {attachment_id} not found")
+        return attachment_adapter.validate_json(row[0])
+
+    def _delete_attachment(self, attachment_id: str):
+        with self._conn:
+            self._conn.execute("DELETE FROM attachments WHERE id = ?", (attachment_id,))
+
+    # --- Interface Implementation ---
+
+    async def load_thread(self, thread_id: str, context: dict) -> ThreadMetadata:
+        return await self._run(self._load_thread, thread_id)
+
+    async def save_thread(self, thread: ThreadMetadata, context: dict) -> None:
+        await self._run(self._save_thread, thread)
+
+    async def load_threads(
+        self, limit: int, after: str | None, order: str, context: dict
+    ) -> Page[ThreadMetadata]:
+        return await self._run(self._load_threads, limit, after, order)
+
+    async def load_thread_items(
+        self, thread_id: str, after: str | None, limit: int, order: str, context: dict
+    ) -> Page[ThreadItem]:
+        return await self._run(self._load_thread_items, thread_id, after, limit, order)
+
+    async def add_thread_item(
+        self, thread_id: str, item: ThreadItem, context: dict
+    ) -> None:
+        ensure_valid_id(item, context)
+        await self._run(self._save_item, thread_id, item)
+
+    async def save_item(self, thread_id: str, item: ThreadItem, context: dict) -> None:
+        ensure_valid_id(item, context)
+        await self._run(self._save_item, thread_id, item)
+
+    async def load_item(
+        self, thread_id: str, item_id: str, context: dict
+    ) -> ThreadItem:
+        return await self._run(self._load_item, thread_id, item_id)
+
+    async def delete_thread(self, thread_id: str, context: dict) -> None:
+        await self._run(self._delete_thread, thread_id)
+
+    async def delete_thread_item(
+        self, thread_id: str, item_id: str, context: dict
+    ) -> None:
+        await self._run(self._delete_thread_item, thread_id, item_id)
+
+    async def save_attachment(self, attachment: Attachment, context: dict) -> None:
+        await self._run(self._save_attachment, attachment)
+
+    async def load_attachment(self, attachment_id: str, context: dict) -> Attachment:
+        return await self._run(self._load_attachment, attachment_id)
+
+    async def delete_attachment(self, attachment_id: str, context: dict) -> None:
+        await self._run(self._delete_attachment, attachment_id)
@@ -0,0 +1,103 @@
+"""
+Registry of the tools an agent may call, built from the FunctionTool objects
+in tools.py.
+
+The same FunctionTool serves both calling conventions: it is handed to the
+Agent for the model's native function calling, and ToolRegistry.call runs it
+(with the SDK's argument validation) for tool calls the model writes as a
+JSON array in its reply, which parse_tool_calls extracts.
+"""
+
+import json
+import re
+import uuid
+
+from agents import FunctionTool
+from agents.tool_context import ToolContext
+
+from utils import sanitize_tool_json
+
+# Start of the message the SDK returns when a tool raises or gets bad arguments
+TOOL_ERROR_PREFIX = "An error occurred while running the tool"
+
+
+def canonical_tool_name(name: str) -> str:
+    """Strips the _raw suffix so both variants of a tool name work."""
+    return name[:-4] if name.endswith("_raw") else name
+
+
+class ToolRegistry:
+    """
+    args:
+        tools (list[FunctionTool]): Tools, registered under their name without _raw
+    """
+
+    def __init__(self, tools: list[FunctionTool]):
+        self._tools = {canonical_tool_name(tool.name): tool for tool in tools}
+
+    @property
+    def function_tools(self) -> list[FunctionTool]:
+        """For Agent(tools=...)."""
+        return list(self._tools.values())
+
+    @property
+    def call_names(self) -> list[str]:
+        """Every name a JSON tool call may use for these tools."""
+        return [variant for name in self._tools for variant in (name, f"{name}_raw")]
+
+    def __contains__(self, name: str) -> bool:
+        return canonical_tool_name(name) in self._tools
+
+    async def call(self, name: str, arguments: dict, context=None) -> object:
+        """
+        Runs a tool the way the SDK runs a native call: arguments are validated
+        against the tool's schema, and failures come back as an error message
+        starting with TOOL_ERROR_PREFIX instead of raising.
+
+        Returns whatever the tool returns (a string, or the rows of a report
+        lookup as tuples), or an error string.
+        """
+        tool = self._tools.get(canonical_tool_name(name))
+        if tool is None:
+            return f"Error: Unknown tool {name}"
+        arguments_json = json.dumps(arguments if isinstance(arguments, dict) else {})
+        tool_context = ToolContext(
+            context,
+            tool_name=tool.name,
+            tool_call_id=f"call_{uuid.uuid4().hex[:8]}",
+            tool_arguments=arguments_json,
+        )
+        return await tool.on_invoke_tool(tool_context, arguments_json)
+
+
+def tool_call_pattern(names) -> re.Pattern:
+    """Matches the start of a JSON tool call array for one of names."""
+    # A stray comma after the bracket is tolerated (and repaired by sanitize_tool_json)
+    return re.compile(r'\[\s*,?\s*\{\s*"name"\s*:\s*"(?:' + "|".join(map(re.escape, names)) + r')"')
+
+
+_decoder = json.JSONDecoder()
+
+
+def parse_tool_calls(text: str, pattern: re.Pattern) -> tuple[list[dict] | None, str | None]:
+    """
+    Finds the first JSON tool call array in a model reply. The array is
+    decoded from where it starts to where the JSON value ends, so brackets
+    inside argument strings or text after the array do not matter. Leading
+    and trailing commas in the array are repaired.
+
+    Returns (calls, None), (None, error) if a tool call was started but is
+    not valid JSON, or (None, None) if the reply has no tool call.
+    """
+    error = None
+    for match in pattern.finditer(text):
+        remainder = text[match.start():]
+        for candidate in (remainder, sanitize_tool_json(remainder)):
+            try:
+                value, _ = _decoder.raw_decode(candidate)
+            except json.JSONDecodeError as e:
+                error = str(e)
+                continue
+            if isinstance(value, list):
+                return [call for call in value if isinstance(call, dict)], None
+    return None, error
@@ -0,0 +1,226 @@
+"""
+Streams an agent turn to the client while watching it for a JSON tool call.
+
+The agents announce tool calls as text, e.g.
+[{"name": "get_reports_by_reportID", "arguments": {...}}], and a turn that
+turns out to be a tool call must not reach the client. Instead of buffering
+the whole turn until the model is done, TurnStream forwards text deltas as
+soon as they cannot be the start of a tool call and holds back only the
+ambiguous suffix, so the first words show up at the model's first-token
+latency.
+"""
+
+from chatkit.types import (
+    AssistantMessageContentPartDone,
+    AssistantMessageContentPartTextDelta,
+    AssistantMessageItem,
+    ThreadItemAddedEvent,
+    ThreadItemDoneEvent,
+    ThreadItemRemovedEvent,
+    ThreadItemUpdatedEvent,
+)
+
+FAKE_ITEM_ID = "__fake_id__"
+
+
+class ToolCallDetector:
+    """
+    Incremental check for a tool call prefix, [{"name": "<tool>", in a
+    stream of text deltas (whitespace between the tokens is ignored).
+
+    feed() returns the part of the text seen so far that is certainly not
+    part of a tool call; once a full prefix has been seen, detected is set
+    and nothing more is released.
+
+    args:
+        tool_names (iterable of str): Names that make a JSON array a tool call
+    """
+
+    def __init__(self, tool_names):
+        self._targets = [f'[{{"name":"{name}"' for name in tool_names]
+        self._longest = max(len(target) for target in self._targets)
+        self._held = ""
+        self.detected = False
+
+    def feed(self, delta: str) -> str:
+        if self.detected:
+            return ""
+        self._held += delta
+        released = []
+        while True:
+            start = self._held.find("[")
+            if start == -1:
+                released.append(self._held)
+                self._held = ""
+                break
+            released.append(self._held[:start])
+            self._held = self._held[start:]
+            state = self._match(self._held)
+            if state == "match":
+                self.detected = True
+                break
+            if state == "partial":
+                break
+            # Not a tool call at this bracket: release it and look further
+            released.append("[")
+            self._held = self._held[1:]
+        return "".join(released)
+
+    def flush(self) -> str:
+        """Releases the held-back suffix at the end of the text, unless it was a tool call."""
+        held, self._held = self._held, ""
+        return "" if self.detected else held
+
+    def _match(self, candidate: str) -> str:
+        compact = []
+        for char in candidate:
+            if not char.isspace():
+                compact.append(char)
+                if len(compact) >= self._longest:
+                    break
+        compact = "".join(compact)
+        if any(compact.startswith(target) for target in self._targets):
+            return "match"
+        if any(target.startswith(compact) for target in self._targets):
+            return "partial"
+        return "none"
+
+
+class TurnStream:
+    """
+    Filters the ChatKit events of one agent turn (stream_agent_response).
+
+    Assistant message events are forwarded as they arrive, with text deltas
+    cut by a ToolCallDetector; a message is only announced to the client
+    once it has text to show. If a tool call shows up after text was already
+    shown, the message is withdrawn with a ThreadItemRemovedEvent. Other
+    events are held until the end of the turn and forwarded only if it was
+    not a tool call.
+
+    args:
+        tool_names (iterable of str): Names that make a JSON array a tool call
+        item_id (str, optional): Replaces the placeholder ID LiteLLM gives messages
+    """
+
+    def __init__(self, tool_names, item_id: str | None = None):
+        self.tool_names = list(tool_names)
+        self.item_id = item_id
+        self.text = ""
+        self.tool_call_detected = False
+        self._message_id = None
+        self._detector = None
+        self._streamed = False
+        self._pending = []  # events of the current message not shown yet
+        self._announced = set()  # message IDs the client has seen
+        self._deferred = []  # non-message events, forwarded at the end of the turn
+        self._last_message = None
+
+    async def forward(self, events):
+        async for event in events:
+            self._patch_id(event)
+
+            if isinstance(event, ThreadItemAddedEvent) and isinstance(event.item, AssistantMessageItem):
+                self._message_id = event.item.id
+                self._detector = ToolCallDetector(self.tool_names)
+                self._streamed = False
+                self._pending = [event]
+                continue
+
+            if isinstance(event, ThreadItemUpdatedEvent) and event.item_id == self._message_id:
+                update = event.update
+                if isinstance(update, AssistantMessageContentPartTextDelta):
+                    self._streamed = True
+                    safe = self._detector.feed(update.delta)
+                    if safe:
+                        for shown in self._show(self._delta(event, safe)):
+                            yield shown
+                elif isinstance(update, AssistantMessageContentPartDone):
+                    rest = self._detector.flush()
+                    if rest:
+                        for shown in self._show(self._delta(event, rest)):
+                            yield shown
+                    if not self._detector.detected:
+                        for shown in self._show(event):
+                            yield shown
+                elif self._message_id not in self._announced:
+                    # Includes ContentPartAdded: sent along with the message once it has text
+                    self._pending.append(event)
+                else:
+                    yield event
+                continue
+
+            if isinstance(event, ThreadItemDoneEvent) and isinstance(event.item, AssistantMessageItem):
+                text = "".join(part.text for part in event.item.content if hasattr(part, "text"))
+                self.text += text
+                self._last_message = event.item
+                if self._detector is None or not self._streamed:
+                    # Not streamed as deltas: judge the message by its full text
+                    self._detector = ToolCallDetector(self.tool_names)
+                    self._detector.feed(text)
+                    rest = ""
+                else:
+                    rest = self._detector.flush()
+                if self._detector.detected:
+                    self.tool_call_detected = True
+                    if event.item.id in self._announced:
+                        self._announced.discard(event.item.id)
+                        yield ThreadItemRemovedEvent(item_id=event.item.id)
+                else:
+                    if rest:
+                        for shown in self._show(self._delta_for(event.item.id, rest)):
+                            yield shown
+                    for shown in self._show(event):
+                        yield shown
+                self._message_id, self._detector, self._pending = None, None, []
+                continue
+
+            self._deferred.append(event)
+
+        if not self.tool_call_detected:
+            for event in self._deferred:
+                yield event
+
+    def release(self):
+        """
+        Shows a turn that was held back as a tool call but could not be
+        executed, e.g. malformed JSON, so the user sees what the model wrote.
+        """
+        if self._last_message is not None and self._last_message.id not in self._announced:
+            yield ThreadItemAddedEvent(item=self._last_message)
+            yield ThreadItemDoneEvent(item=self._last_message)
+        for event in self._deferred:
+            yield event
+
+    def withdraw(self):
+        """Removes messages shown to the client, for a tool call the detector missed."""
+        for item_id in self._announced:
+            yield ThreadItemRemovedEvent(item_id=item_id)
+        self._announced.clear()
+
+    def _show(self, event):
+        """Yields event, preceded by the held events of its message the first time."""
+        item_id = self._message_id or event.item.id
+        if item_id not in self._announced:
+            self._announced.add(item_id)
+            yield from self._pending
+            self._pending = []
+        yield event
+
+    def _delta(self, event: ThreadItemUpdatedEvent, text: str) -> ThreadItemUpdatedEvent:
+        return self._delta_for(event.item_id, text, event.update.content_index)
+
+    @staticmethod
+    def _delta_for(item_id: str, text: str, content_index: int = 0) -> ThreadItemUpdatedEvent:
+        return ThreadItemUpdatedEvent(
+            item_id=item_id,
+            update=AssistantMessageContentPartTextDelta(content_index=content_index, delta=text),
+        )
+
+    def _patch_id(self, event):
+        if self.item_id is None:
+            return
+        if hasattr(event, "item_id") and (event.item_id == FAKE_ITEM_ID or not event.item_id):
+            event.item_id = self.item_id
+        item = getattr(event, "item", None)
+        if isinstance(item, AssistantMessageItem) and (item.id == FAKE_ITEM_ID or not item.id):
+            item.id = self.item_id
@@ -1,19 +1,16 @@
 from agents import function_tool
-from vectorstore import collection
-import psycopg2
+from vectorstore import get_collection
 import json
-import chromadb
-from database import DB_CONFIG, TARGET_DB
+import re
+from database import get_async_connection
 from utils import checkEnvVariable
+from embeddings import embed_query
+from tool_registry import ToolRegistry
+from result_cache import cached_result
 import requests
 
-# Connect to DBs
-chroma_client = chromadb.PersistentClient(path="./my_local_db")
-collection = chroma_client.get_or_create_collection(name="pdf_knowledge_base_v2")
-
-
-def get_db_connection():
-    return psycopg2.connect(dbname=TARGET_DB, **DB_CONFIG)
+# Canonical MITRE ATT&CK technique / sub-technique ID, e.g. T1566 or T1566.001
+TECHNIQUE_ID_PATTERN = re.compile(r"^T\d{4}(\.\d{3})?$")
 
 
 def search_knowledge_base_raw(query: str, filename: str) -> str:
@@ -23,8 +20,9 @@ def search_knowledge_base_raw(query: str, filename: str) -> str:
     """
     print("Filename : ", filename)
     # Query ChromaDB
-    results = collection.query(
-        query_texts=[query],
+    # Query vectors come from the embedding cache, so repeated questions skip Ollama
+    results = get_collection().query(
+        query_embeddings=[embed_query(query)],
         where={"filename": {"$eq": filename}},
         n_results=5  # Return top 5 matches
     )
@@ -36,6 +34,7 @@ def search_knowledge_base_raw(query: str, filename: str) -> str:
     return found_text
 
 
+@cached_result()
 async def search_indicators_by_report_raw(report_id: int):
     """
     Fetches all Indicators of Compromise (IoCs) associated with a specific report.
@@ -47,22 +46,22 @@ async def search_indicators_by_report_raw(report_id: int):
         str: JSON string containing a list of IoCs with their types and values,
              or an error message if no indicators are found.
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute("SELECT type, value FROM iocs WHERE report_id = %s", (report_id,))
-        results = cur.fetchall()
-        if not results:
-            return "No indicators found for this report."
-        print("Inside search_indicators_by_report:\n")
-        for r in results:
-            print("type : ", r[0])
-            print("    value : \n", r[1])
-        return json.dumps([{"type": r[0], "value": r[1]} for r in results])
-    finally:
-        conn.close()
+    async with get_async_connection() as conn:
+        cur = await conn.execute(
+            "SELECT d.type, d.value FROM report_iocs ri JOIN ioc d USING (ioc_id) WHERE ri.report_id = %s",
+            (report_id,),
+        )
+        results = await cur.fetchall()
+    if not results:
+        return "No indicators found for this report."
+    print("Inside search_indicators_by_report:\n")
+    for r in results:
+        print("type : ", r[0])
+        print("    value : \n", r[1])
+    return json.dumps([{"type": r[0], "value": r[1]} for r in results])
 
 
+@cached_result(case_insensitive=("sector",))
 async def search_by_victim_raw(sector: str):
     """
     Finds all reports targeting a specific victim sector.
@@ -74,17 +73,14 @@ async def search_by_victim_raw(sector: str):
         str: String representation of a list of tuples containing (report_id, filename, summary, created_at),
              or an empty list if no matching reports are found.
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute("SELECT report_id, filename, summary, created_at FROM reports WHERE victim_sector ILIKE %s", (f"%{sector}%",))
-        results = cur.fetchall()
-        print("Inside search_by_victim. Results:\n", results)
-        return str(results)
-    finally:
-        conn.close()
+    async with get_async_connection() as conn:
+        cur = await conn.execute("SELECT report_id, filename, summary, created_at FROM reports WHERE victim_sector ILIKE %s", (f"%{sector}%",))
+        results = await cur.fetchall()
+    print("Inside search_by_victim. Results:\n", results)
+    return str(results)
 
 
+@cached_result()
 async def get_file_content_raw(filename: str):
     """
     Fetches the raw content, summary, and report ID of a specific file.
@@ -98,19 +94,16 @@ async def get_file_content_raw(filename: str):
     """
     name = filename.split("\\")[-1]
     print("Filename : ", name)
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute("SELECT raw_content, summary, victim_sector FROM reports WHERE filename = %s", (name,))
-        result = cur.fetchone()
-        if not result:
-            return "File not found."
-        print("Inside get_file_content. Result:\n", result)
-        return result
-    finally:
-        conn.close()
+    async with get_async_connection() as conn:
+        cur = await conn.execute("SELECT raw_content, summary, victim_sector FROM reports WHERE filename = %s", (name,))
+        result = await cur.fetchone()
+    if not result:
+        return "File not found."
+    print("Inside get_file_content. Result:\n", result)
+    return result
 
 
+@cached_result(case_insensitive=("technique",))
 async def get_reportsID_by_technique_raw(technique: str):
     """
     Fetches all report IDs associated with a specific MITRE ATT&CK technique.
@@ -123,19 +116,32 @@ async def get_reportsID_by_technique_raw(technique: str):
              or an error message if no reports are found.
     """
     print("Technique : ", technique)
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute("SELECT report_id, technique_name FROM ttps WHERE technique_id ILIKE %s", (f"%{technique}%",))
-        results = cur.fetchall()
-        print("Results from get_reportsID_by_technique : \n", results)
+    technique_key = technique.strip().upper()
+    async with get_async_connection() as conn:
+        results = []
+        if TECHNIQUE_ID_PATTERN.match(technique_key):
+            # Exact ID (plus its sub-techniques) via the report_techniques index;
+            # technique IDs are stored upper-cased
+            cur = await conn.execute(
+                "SELECT rt.report_id, t.name FROM report_techniques rt JOIN technique t USING (technique_id) "
+                "WHERE rt.technique_id = %s OR rt.technique_id LIKE %s",
+                (technique_key, f"{technique_key}.%"),
+            )
+            results = await cur.fetchall()
         if not results:
-            return "No reports found for this technique."
-        return str(results)
-    finally:
-        conn.close()
-
-
+            cur = await conn.execute(
+                "SELECT rt.report_id, t.name FROM report_techniques rt JOIN technique t USING (technique_id) "
+                "WHERE t.technique_id ILIKE %s",
+                (f"%{technique.strip()}%",),
+            )
+            results = await cur.fetchall()
+    print("Results from get_reportsID_by_technique : \n", results)
+    if not results:
+        return "No reports found for this technique."
+    return str(results)
+
+
+@cached_result()
 async def get_reports_by_reportID_raw(report_id: int):
     """
     Fetches complete report details for a specific report ID.
@@ -147,17 +153,13 @@ async def get_reports_by_reportID_raw(report_id: int):
         tuple: A tuple containing all report fields from the database,
                or an error message if the report is not found.
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute(" SELECT * from reports WHERE report_id = %s", (report_id,))
-        result = cur.fetchone()
-        if not result:
-            return "Report not found."
-        print("Inside get_reports_by_reportID. Result:\n", result)
-        return result
-    finally:
-        conn.close()
+    async with get_async_connection() as conn:
+        cur = await conn.execute(" SELECT * from reports WHERE report_id = %s", (report_id,))
+        result = await cur.fetchone()
+    if not result:
+        return "Report not found."
+    print("Inside get_reports_by_reportID. Result:\n", result)
+    return result
 
 
 async def analyse_wazuh_data_raw(size: int = 20, domain: str = "*"):
@@ -226,4 +228,14 @@ search_by_victim = function_tool(search_by_victim_raw)
 get_file_content = function_tool(get_file_content_raw)
 get_reportsID_by_technique = function_tool(get_reportsID_by_technique_raw)
 get_reports_by_reportID = function_tool(get_reports_by_reportID_raw)
-analyse_wazuh_data = function_tool(analyse_wazuh_data_raw)
\ No newline at end of file
+analyse_wazuh_data = function_tool(analyse_wazuh_data_raw)
+
+# Tools each agent can call with a JSON array in its reply (see tool_registry)
+report_tools = ToolRegistry([
+    search_indicators_by_report,
+    search_by_victim,
+    get_file_content,
+    get_reportsID_by_technique,
+    get_reports_by_reportID,
+])
+wazuh_tools = ToolRegistry([analyse_wazuh_data])
@@ -1,12 +1,15 @@
+import asyncio
 import boto3
+from boto3.exceptions import S3UploadFailedError
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
 import os
+import threading
 import requests
-from agents import Runner
 
-import json
 import re
-import traceback
 
 def sanitize_tool_json(json_str: str) -> str:
     """Fix common JSON malformations from LLM output (e.g. leading/trailing commas)."""
@@ -15,9 +18,54 @@ def sanitize_tool_json(json_str: str) -> str:
     return json_str
 
 
+# Multipart part size for uploads; S3 requires >= 5 MiB for all but the last part
+S3_PART_SIZE = max(int(os.environ.get("S3_PART_SIZE", str(8 * 1024 * 1024))), 5 * 1024 * 1024)
+# Parts uploaded concurrently per streamed upload
+S3_MAX_INFLIGHT_PARTS = int(os.environ.get("S3_MAX_INFLIGHT_PARTS", "2"))
+# Parts uploaded concurrently per file by upload_file_to_s3
+S3_MAX_CONCURRENCY = int(os.environ.get("S3_MAX_CONCURRENCY", "8"))
+# Threads running S3 calls for async callers
+S3_UPLOAD_WORKERS = int(os.environ.get("S3_UPLOAD_WORKERS", "4"))
+
+S3_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=S3_PART_SIZE,
+    multipart_chunksize=S3_PART_SIZE,
+    max_concurrency=S3_MAX_CONCURRENCY,
+    use_threads=True,
+)
+
+_s3_client = None
+_s3_client_lock = threading.Lock()
+_s3_executor = ThreadPoolExecutor(max_workers=S3_UPLOAD_WORKERS, thread_name_prefix="s3")
+
+
+def get_s3_client():
+    """
+    Process-wide S3 client. Creating one resolves credentials and endpoints,
+    which is slow, and clients are thread-safe, so it is built once. The
+    connection pool is sized for every S3 thread uploading at full concurrency.
+    """
+    global _s3_client
+    if _s3_client is None:
+        with _s3_client_lock:
+            if _s3_client is None:
+                _s3_client = boto3.client(
+                    "s3",
+                    config=Config(max_pool_connections=S3_UPLOAD_WORKERS * max(S3_MAX_CONCURRENCY, S3_MAX_INFLIGHT_PARTS)),
+                )
+    return _s3_client
+
+
+async def run_in_s3_executor(func, *args, **kwargs):
+    """Runs a blocking S3 call on the S3 thread pool instead of the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_s3_executor, lambda: func(*args, **kwargs))
+
+
 def upload_file_to_s3(file_name, bucket_name, object_name = None):
     """
-    Uploads a file to an S3 bucket
+    Uploads a file to an S3 bucket. Files above S3_PART_SIZE go up as a
+    multipart upload with S3_MAX_CONCURRENCY parts in parallel.
 
     args:
         file_name (str): The path to the file to upload
@@ -27,16 +75,115 @@ def upload_file_to_s3(file_name, bucket_name, object_name = None):
     if object_name is None:
         object_name = file_name
     
-    s3_client = boto3.client("s3")
     try:
-        response = s3_client.upload_file(file_name, bucket_name, object_name)
-        s3_url = f"https://{bucket_name}.s3.us-east-1.amazonaws.com/{object_name}"
-        return s3_url
-    except ClientError as e:
+        get_s3_client().upload_file(file_name, bucket_name, object_name, Config=S3_TRANSFER_CONFIG)
+        return s3_object_url(bucket_name, object_name)
+    except (ClientError, S3UploadFailedError) as e:
         print(e)
         return "Failed to upload file to S3"
 
 
+async def upload_file_to_s3_async(file_name, bucket_name, object_name = None):
+    """upload_file_to_s3 for async callers; runs on the S3 thread pool."""
+    return await run_in_s3_executor(upload_file_to_s3, file_name, bucket_name, object_name)
+
+
+def s3_object_url(bucket_name, object_name):
+    return f"https://{bucket_name}.s3.us-east-1.amazonaws.com/{object_name}"
+
+
+class S3StreamingUpload:
+    """
+    S3 multipart upload fed chunk by chunk, e.g. from a request body stream.
+
+    Chunks are gathered into S3_PART_SIZE parts. Each part is uploaded in a
+    worker thread while the next one fills, with at most S3_MAX_INFLIGHT_PARTS
+    in flight, so memory per upload stays around part size x (in-flight + 1)
+    whatever the file size.
+
+    args:
+        bucket_name (str): The name of the S3 bucket
+        object_name (str): The key of the object in the bucket
+    """
+
+    def __init__(self, bucket_name, object_name, part_size=S3_PART_SIZE, max_inflight=S3_MAX_INFLIGHT_PARTS):
+        self.bucket_name = bucket_name
+        self.object_name = object_name
+        self.part_size = part_size
+        self.max_inflight = max(1, max_inflight)
+        self._client = get_s3_client()
+        self._upload_id = None
+        self._buffer = bytearray()
+        self._tasks = []
+        self._completed = False
+
+    async def start(self):
+        response = await run_in_s3_executor(
+            self._client.create_multipart_upload, Bucket=self.bucket_name, Key=self.object_name
+        )
+        self._upload_id = response["UploadId"]
+
+    async def write(self, chunk: bytes):
+        self._buffer += chunk
+        while len(self._buffer) >= self.part_size:
+            with memoryview(self._buffer) as view:
+                part = bytes(view[:self.part_size])
+            del self._buffer[:self.part_size]
+            await self._submit(part)
+
+    async def complete(self) -> str:
+        """Uploads the remainder, completes the upload and returns the object URL."""
+        if self._buffer or not self._tasks:
+            await self._submit(bytes(self._buffer))
+            self._buffer.clear()
+        parts = await asyncio.gather(*self._tasks)
+        await run_in_s3_executor(
+            self._client.complete_multipart_upload,
+            Bucket=self.bucket_name,
+            Key=self.object_name,
+            UploadId=self._upload_id,
+            MultipartUpload={"Parts": sorted(parts, key=lambda p: p["PartNumber"])},
+        )
+        self._completed = True
+        return s3_object_url(self.bucket_name, self.object_name)
+
+    async def discard(self):
+        """Aborts an unfinished upload, or deletes the object if it was completed."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._buffer.clear()
+        try:
+            if self._completed:
+                await run_in_s3_executor(self._client.delete_object, Bucket=self.bucket_name, Key=self.object_name)
+            elif self._upload_id:
+                await run_in_s3_executor(
+                    self._client.abort_multipart_upload,
+                    Bucket=self.bucket_name, Key=self.object_name, UploadId=self._upload_id,
+                )
+        except ClientError as e:
+            print(f"Could not discard S3 upload {self.object_name}: {e}")
+
+    async def _submit(self, data: bytes):
+        in_flight = [task for task in self._tasks if not task.done()]
+        if len(in_flight) >= self.max_inflight:
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()  # surface a failed part now rather than at complete()
+        part_number = len(self._tasks) + 1
+        self._tasks.append(asyncio.create_task(run_in_s3_executor(self._upload_part, part_number, data)))
+
+    def _upload_part(self, part_number: int, data: bytes) -> dict:
+        response = self._client.upload_part(
+            Bucket=self.bucket_name,
+            Key=self.object_name,
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            Body=data,
+        )
+        return {"PartNumber": part_number, "ETag": response["ETag"]}
+
+
 def get_token(WAZUH_API_URL, WAZUH_API_USER, WAZUH_API_PASS):
     """
     Authenticates Wazuh API and returns the JWT token.
@@ -64,11 +211,11 @@ def checkEnvVariable(var_name):
 async def handling_wazuh_agent(query, context):
     """
     Runs the Wazuh agent and yields events directly to the UI for real-time streaming.
-    Only the final response (after all tool calls complete) is yielded to the UI.
+    Turns that only call a tool are not shown; the final response streams as it is generated.
     """
     from llmAgent import wazuh_agent
-    from chatkit.agents import stream_agent_response
-    from tools import analyse_wazuh_data_raw
+    from react_loop import ToolLoop
+    from tools import wazuh_tools
     from chatkit.types import ThreadItemAddedEvent, ThreadItemDoneEvent, AssistantMessageItem
     from datetime import datetime
     import uuid
@@ -76,66 +223,11 @@ async def handling_wazuh_agent(query, context):
     conversation_chain = [{"role": "user", "content": query}]
     print("Wazuh Agent: ", conversation_chain)
     
-    max_turns = 5
-    for turn in range(max_turns):
-        full_turn_response = ""
-        tool_calls_found = False
-        buffered_events = []  # Buffer events for potential yielding
-
-        streamed_result = Runner.run_streamed(wazuh_agent, conversation_chain)
-        async for event in stream_agent_response(context, streamed_result):
-            # Capture text from thread.item.done events
-            if event.type == "thread.item.done" and hasattr(event, "item"):
-                item_obj = event.item
-                if hasattr(item_obj, "content") and item_obj.content:
-                    for part in item_obj.content:
-                        if hasattr(part, "text"):
-                            print("Wazuh Agent Response: ", part.text[:100] if len(part.text) > 100 else part.text)
-                            full_turn_response += part.text
-            
-            # Buffer ALL events for proper ChatKit lifecycle (added → updates → done)
-            buffered_events.append(event)
-        
-        try:
-            match = re.search(r'(\[\s*\{\s*"name"\s*:\s*"(?:analyse_wazuh_data|analyse_wazuh_data_raw)".*?\])', full_turn_response, re.DOTALL)
-            
-            if match:
-                possible_json = match.group(1)
-                possible_json = sanitize_tool_json(possible_json)
-                tool_calls = json.loads(possible_json)
-                if isinstance(tool_calls, list):
-                    tool_calls_found = True
-                    print(f"Tool call detected in turn {turn + 1}, executing...")
-
-                    tool_outputs = []
-                    for call in tool_calls:
-                        res = "Error: Unknown tool"
-                        name = call.get("name")
-                        args = call.get("arguments", {})
-                            
-                        try:
-                            if name in ("analyse_wazuh_data_raw", "analyse_wazuh_data"):
-                                res = await analyse_wazuh_data_raw(**args)
-                        except Exception as tool_err:
-                            res = f"Tool Execution Error: {tool_err}"
-                            
-                        tool_outputs.append(res)
-                        
-                    # Update Chain for next iteration
-                    conversation_chain.append({"role": "assistant", "content": full_turn_response})
-                    conversation_chain.append({"role": "user", "content": f"Tool Output: {json.dumps(tool_outputs)}"})
-                        
-        except json.JSONDecodeError:
-            pass
-        except Exception as e:
-            print(f"Error parsing tool call: {e}")
-            traceback.print_exc()
-
-        # Yield events to UI ONLY when no more tool calls (this is the final response)
-        if not tool_calls_found:
-            for event in buffered_events:
-                yield event
-            return  # Exit the generator
+    tool_loop = ToolLoop(wazuh_agent, wazuh_tools, max_turns=5, batch=True)
+    async for event in tool_loop.run(conversation_chain, lambda: context):
+        yield event
+    if tool_loop.answered:
+        return  # Exit the generator
     
     # Max turns exceeded - yield error message to UI
     print("Wazuh Agent: Max turns exceeded, yielding error to UI")
@@ -1,81 +1,198 @@
+import asyncio
 import chromadb
+import hashlib
 import os
-import psycopg2
+import threading
+import time
 from agents import Runner
-from database import DB_CONFIG, TARGET_DB
-from chromadb.utils.embedding_functions.ollama_embedding_function import (
-    OllamaEmbeddingFunction,
+from database import (
+    bump_result_generation, get_async_connection, get_connection, insert_report_iocs, insert_report_techniques,
 )
-from unstructured.partition.text import partition_text
-from unstructured.partition.pdf import partition_pdf
+from document_parser import partition_document
+from chunking import chunk_elements, join_elements
+from embeddings import emb_fn, embed_documents
+from result_cache import invalidate_results
 import uuid
-client = chromadb.PersistentClient(path="./my_local_db")
-emb_fn = OllamaEmbeddingFunction(
-    url = "http://localhost:11434",
-    model_name="mxbai-embed-large:latest"
-)
-collection = client.get_or_create_collection(name="pdf_knowledge_base_v2", embedding_function=emb_fn)
 
-async def ingest_txt(file_path, s3_url):
+CHROMA_PATH = os.environ.get("CHROMA_PATH", "./my_local_db")
+CHROMA_COLLECTION = os.environ.get("CHROMA_COLLECTION", "pdf_knowledge_base_v2")
+
+_collection = None
+_collection_lock = threading.Lock()
+
+
+def get_collection():
+    """
+    The process-wide Chroma collection, opened on first use. Every caller
+    shares this handle, so there is one client on the persistent directory
+    and one embedding function (the model the stored vectors were made with).
+    """
+    global _collection
+    if _collection is None:
+        with _collection_lock:
+            if _collection is None:
+                client = chromadb.PersistentClient(path=CHROMA_PATH)
+                _collection = client.get_or_create_collection(name=CHROMA_COLLECTION, embedding_function=emb_fn)
+    return _collection
+
+
+def warm_up_vector_store():
+    """
+    Opens the collection and has Ollama load the embedding model, so the
+    first upload or search does not pay for either. Blocking; call it from a
+    thread on startup.
+    """
+    started = time.perf_counter()
+    try:
+        count = get_collection().count()
+        emb_fn(["warm-up"])
+        print(f"Vector store ready: {count} chunks in {CHROMA_COLLECTION} ({time.perf_counter() - started:.1f}s)")
+    except Exception as e:
+        print(f"Vector store warm-up failed, it will be retried on first use: {e}")
+
+
+def file_sha256(file_path) -> str:
+    """SHA-256 of the uploaded file's bytes, the key used to detect re-uploads."""
+    with open(file_path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+async def find_ingested_report(filename: str, content_hash: str):
+    """
+    Returns (report_id, filename) of an already ingested report with the same
+    filename or the same file content, or None.
+    """
+    async with get_async_connection() as conn:
+        cur = await conn.execute(
+            "SELECT report_id, filename FROM reports WHERE filename = %s OR content_hash = %s LIMIT 1",
+            (filename, content_hash),
+        )
+        return await cur.fetchone()
+
+
+def store_report(filename, s3_url, content, content_hash, data, chunks, embeddings):
+    """
+    Writes a report, its IoCs/TTPs and its chunk vectors. The vectors are
+    added to Chroma inside the Postgres transaction and removed again if the
+    commit fails, so a committed report always has its vectors. Blocking;
+    run it in a thread.
+
+    Returns the new report_id, or None if the file or content was ingested
+    concurrently.
+    """
+    with get_connection() as conn:
+        cur = conn.cursor()
+        # Unparseable timelines become NULL; the original text is kept in timeline_raw.
+        # ON CONFLICT covers a concurrent upload of the same filename or content.
+        cur.execute("""
+            INSERT INTO reports (filename, summary, severity, victim_sector, timeline_start, timeline_end,
+                                 timeline_raw, raw_content, content_hash)
+            VALUES (%s, %s, %s, %s, try_timestamptz(%s), try_timestamptz(%s),
+                    NULLIF(concat_ws(' / ', %s::text, %s::text), ''), %s, %s)
+            ON CONFLICT DO NOTHING RETURNING report_id;
+        """, (filename, data.summary, data.severity, data.victim_sector, data.timeline_start, data.timeline_end,
+              data.timeline_start, data.timeline_end, content, content_hash))
+
+        row = cur.fetchone()
+        if row is None:
+            return None
+        report_id = row[0]
+
+        # Bulk-insert IoCs and TTPs (deduplicated) in the same transaction
+        started = time.perf_counter()
+        ioc_count = insert_report_iocs(cur, report_id, [(ioc.type, ioc.value) for ioc in data.iocs])
+        ttp_count = insert_report_techniques(cur, report_id, [(ttp.technique_id, ttp.name) for ttp in data.ttps])
+        elapsed = time.perf_counter() - started
+        rows = ioc_count + ttp_count
+        print(f"--> Inserted {ioc_count} IoCs and {ttp_count} TTPs in {elapsed:.3f}s "
+              f"({rows / elapsed if elapsed else 0:.0f} rows/s)")
+
+        base = {"report_id": report_id, "severity": data.severity, "s3_url": s3_url, "filename": filename}
+        ids = [str(uuid.uuid4()) for _ in range(len(chunks))]
+        collection = get_collection()
+        collection.add(
+            documents=[chunk["text"] for chunk in chunks],
+            embeddings=embeddings,
+            metadatas=[
+                {**base, "chunk_type": "text", **{k: v for k, v in chunk.items() if k != "text"}}
+                for chunk in chunks
+            ],
+            ids=ids,
+        )
+        # Right before the commit: the counter's row lock is held for as short as possible
+        bump_result_generation(cur)
+        try:
+            conn.commit()
+        except Exception:
+            collection.delete(ids=ids)
+            raise
+    return report_id
+
+
+async def ingest_txt(file_path, s3_url, content_hash=None, on_progress=None):
+    """
+    Parses a report, extracts IoCs/TTPs with the LLM and stores them in
+    Postgres and ChromaDB. Known files (same name or same content hash) are
+    skipped before any parsing or LLM work.
+
+    args:
+        file_path (str): Path of the uploaded file
+        s3_url (str): Where the original was uploaded
+        content_hash (str, optional): SHA-256 of the file, if the caller already computed it
+        on_progress (async callable, optional): Awaited with the name of each stage
+            (parsing, extracting, embedding, storing) as it starts
+    """
     
     from llmAgent import extraction_assistant
+
+    async def progress(stage):
+        if on_progress is not None:
+            await on_progress(stage)
+
     try:
-        file_type  = file_path.split(".")[-1]
-        if file_type == "pdf":
-            document = partition_pdf(filename=file_path, strategy='auto')
-        else:
-            document = partition_text(filename=file_path)
-        content = ""
-        text=[]
-        for doc in document:
-            content += doc.text
-            text.append(doc.text)        
-        print("Text : \n", text)
+        if content_hash is None:
+            content_hash = await asyncio.to_thread(file_sha256, file_path)
+        existing = await find_ingested_report(file_path.split("/")[-1], content_hash)
+        if existing:
+            print(f"--> Skipping {file_path}: already ingested as Report ID {existing[0]} ({existing[1]})")
+            return {"success" : True, "message" : "File already ingested", "report_id": existing[0]}
+
+        await progress("parsing")
+        # Runs in the parser process pool, off the event loop
+        document = await partition_document(file_path)
+        # Elements are joined with blank lines so chunk offsets index raw_content
+        content = join_elements(document)
+        text = [doc["text"] for doc in document]
+        print(f"Text : {len(text)} elements, {len(content)} characters")
+        await progress("extracting")
         extracted_data = await Runner.run(extraction_assistant, content)
         data = extracted_data.final_output
         
         file_path = file_path.split("/")[-1] # file_path is now '4.txt', '5.txt', '2.txt'
-        conn = psycopg2.connect(dbname=TARGET_DB, **DB_CONFIG)
-        cur = conn.cursor()
         if len(text) > 0:
-            #check whether the file is already ingested
-            cur.execute("SELECT * FROM reports WHERE filename = %s", (file_path,))
-            if cur.fetchone():
-                return {"success" : True, "message" : "File already ingested"}
-            
-            cur.execute("""
-                INSERT INTO reports (filename, summary, severity, victim_sector, timeline_start, timeline_end, raw_content)
-                VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING report_id;
-            """, (file_path, data.summary, data.severity, data.victim_sector, data.timeline_start, data.timeline_end, content))
-            
-            report_id = cur.fetchone()[0]
-            
-            # Inserting IoCs
-            for ioc in data.iocs:
-                cur.execute("INSERT INTO iocs (report_id, value, type) VALUES (%s, %s, %s)", 
-                            (report_id, ioc.value, ioc.type))
-                
-            # Inserting TTPs
-            for ttp in data.ttps:
-                cur.execute("INSERT INTO ttps (report_id, technique_id, technique_name) VALUES (%s, %s, %s)", 
-                            (report_id, ttp.technique_id, ttp.name))
-            
-            conn.commit()
-            
-            # Storing in ChromaDB (Vector Store)
-            text.append(f"Summary: {data.summary}")
-            collection.add(
-                documents=text,
-                metadatas=[{"report_id": report_id, "severity": data.severity, "s3_url": s3_url, "filename": file_path} for _ in range(len(text))],
-                ids=[str(uuid.uuid4()) for _ in range(len(text))]
+            # Embedded before anything is stored, so a failure here leaves no
+            # report row behind and the job's retry starts over
+            await progress("embedding")
+            chunks = chunk_elements(document)
+            chunks.append({"text": f"Summary: {data.summary}", "chunk_index": len(chunks), "chunk_type": "summary"})
+            documents = [chunk["text"] for chunk in chunks]
+            # Embedded here in concurrent batches; Chroma only stores the vectors
+            embeddings = await embed_documents(documents)
+
+            await progress("storing")
+            report_id = await asyncio.to_thread(
+                store_report, file_path, s3_url, content, content_hash, data, chunks, embeddings
             )
+            if report_id is None:
+                return {"success" : True, "message" : "File already ingested"}
+            # Other processes see the new generation within RESULT_CACHE_CHECK_INTERVAL
+            invalidate_results()
+            print(f"--> Embedded {len(chunks)} chunks from {len(text)} elements")
             print(f"--> Successfully ingested Report ID: {report_id}")
-            return {"success" : True, "message" : "File processed successfully"}
+            return {"success" : True, "message" : "File processed successfully", "report_id": report_id}
         
     except Exception as e:
+        # get_connection rolls back anything left uncommitted
         print(f"Error ingesting {file_path}: {e}")
-        conn.rollback()
-        return {"success" : False, "message" : "File processing failed"}
-    finally:
-        conn.close()
+        return {"success" : False, "message" : "File processing failed", "error": str(e)}
     
\ No newline at end of file